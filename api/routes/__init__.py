@@ -9,3 +9,5 @@ from .orders import *
 
 
 
+from .media import *
+from .internal import *
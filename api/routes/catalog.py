@@ -0,0 +1,157 @@
+from models import db, Product, Category
+from .storage import image_variants
+
+# Read-only query layer for catalog listings.
+# Listings select only the columns they serialize and join the category in the
+# same statement, so rows come back as plain tuples instead of ORM entities
+# (no identity map, no lazy loads per category).
+
+PRODUCT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.image_path,
+    Product.price,
+    Product.rating,
+    Product.best_seller,
+    Product.category_id,
+)
+
+CATEGORY_COLUMNS = (
+    Category.title.label('category_title'),
+    Category.description.label('category_description'),
+    Category.image_path.label('category_image_path'),
+)
+
+
+def product_rows_query():
+    """Select the serialized product columns joined with their category."""
+    return db.select(*PRODUCT_COLUMNS, *CATEGORY_COLUMNS).outerjoin(
+        Category, Product.category_id == Category.id
+    )
+
+
+def fetch_rows(stmt):
+    """Execute a listing statement and return its rows."""
+    return db.session.execute(stmt).all()
+
+
+def format_product(row, favorite_ids):
+    """Helper function to format a product row for listings."""
+    return {
+        "id": row.id,
+        "name": row.name,
+        "description": row.description,
+        "image_path": row.image_path,
+        "images": image_variants(row.image_path),
+        "price": row.price,
+        "rating": row.rating,
+        "best_seller": row.best_seller,
+        "is_favorite": row.id in favorite_ids,
+        "category": {
+            "id": row.category_id,
+            "title": row.category_title,
+            "description": row.category_description,
+            "image_path": row.category_image_path,
+            "images": image_variants(row.category_image_path),
+        } if row.category_title is not None else None,  # Handle missing category gracefully
+    }
+
+
+def category_rows_query(product_count=False):
+    """Select the serialized category columns, optionally with their product counts aggregated in the same query."""
+    stmt = db.select(Category.id, Category.title, Category.description, Category.image_path)
+    if product_count:
+        stmt = stmt.add_columns(db.func.count(Product.id).label('product_count')).outerjoin(
+            Product, Product.category_id == Category.id
+        ).group_by(Category.id)
+    return stmt
+
+
+def category_rows(categories=None):
+    """
+    Return (category, products) pairs in two queries.
+    Loads every category when categories is None, otherwise only the products of the given rows.
+    """
+    products_query = db.select(*PRODUCT_COLUMNS).order_by(Product.id)
+    if categories is None:
+        categories = fetch_rows(category_rows_query().order_by(Category.id))
+    elif categories:
+        products_query = products_query.where(Product.category_id.in_([category.id for category in categories]))
+    else:
+        return []
+    products = fetch_rows(products_query)
+
+    products_by_category = {}
+    for product in products:
+        products_by_category.setdefault(product.category_id, []).append(product)
+
+    return [(category, products_by_category.get(category.id, [])) for category in categories]
+
+
+# Facet buckets by lower bound, the last bucket is open-ended
+PRICE_BUCKETS = (0, 25, 50, 100, 250, 500, 1000)
+RATING_BUCKETS = (0, 1, 2, 3, 4)
+
+
+def product_filter_conditions(filters, exclude=None):
+    """
+    WHERE conditions of the /products filters (see get_product_filters).
+    exclude leaves out the filter of one facet, so a facet counts the choices next to the selected one.
+    """
+    conditions = []
+    if filters.get('category_ids') and exclude != 'category':
+        conditions.append(Product.category_id.in_(filters['category_ids']))
+    if exclude != 'price':
+        if filters.get('min_price') is not None:
+            conditions.append(Product.price >= filters['min_price'])
+        if filters.get('max_price') is not None:
+            conditions.append(Product.price <= filters['max_price'])
+    if filters.get('min_rating') is not None and exclude != 'rating':
+        conditions.append(Product.rating >= filters['min_rating'])
+    if filters.get('best_seller') is not None:
+        conditions.append(Product.best_seller == filters['best_seller'])
+    return conditions
+
+
+def bucket_case(column, bounds):
+    # Index of the bucket a value falls in, NULL for NULL values. The bounds are written into
+    # the SQL so the expression in GROUP BY is textually the one in the select list (Postgres)
+    return db.case(
+        *[(column >= db.literal_column(repr(bound)), db.literal_column(str(index)))
+          for index, bound in reversed(list(enumerate(bounds)))],
+        else_=db.null(),
+    )
+
+
+def facet_counts_query(filters):
+    """Count the products by category, price bucket and rating bucket in one UNION ALL of grouped selects."""
+    def facet(name, key):
+        return db.select(
+            db.literal(name, db.String).label('facet'), key.label('value'), db.func.count().label('count')
+        ).select_from(Product).where(*product_filter_conditions(filters, exclude=name)).group_by(key)
+
+    return db.union_all(
+        facet('category', Product.category_id),
+        facet('price', bucket_case(Product.price, PRICE_BUCKETS)),
+        facet('rating', bucket_case(Product.rating, RATING_BUCKETS)),
+    )
+
+
+def _bucket(bounds, index):
+    if index is None:
+        return {"min": None, "max": None}  # Products without a value, e.g. unrated
+    upper = bounds[index + 1] if index + 1 < len(bounds) else None
+    return {"min": bounds[index], "max": upper}
+
+
+def format_facets(rows):
+    """Turn the (facet, value, count) rows of facet_counts_query into the facets of a response."""
+    facets = {"category": [], "price": [], "rating": []}
+    for row in sorted(rows, key=lambda row: (row.value is None, row.value or 0)):
+        if row.facet == 'category':
+            facets["category"].append({"id": row.value, "count": row.count})
+        else:
+            bounds = PRICE_BUCKETS if row.facet == 'price' else RATING_BUCKETS
+            facets[row.facet].append({**_bucket(bounds, row.value), "count": row.count})
+    return facets
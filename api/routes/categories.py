@@ -1,45 +1,131 @@
 from flask import request, jsonify
 from .. import api_bp
-from models import Category, db, User
-from .shared_functions import process_image, delete_image
+from models import Category, Product, db
+from .images import process_image, schedule_upload, delete_image
+from .storage import image_variants
+from .shared_functions import get_favorite_ids, get_page_params, get_sort_param, fetch_page
+from .catalog import category_rows, category_rows_query, fetch_rows, product_rows_query, format_product
+from .fieldsets import get_fieldset, project
+from cache import cached_catalog, with_favorites
+from decorator import conditional_get
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 CATEGORY_UPLOAD_FOLDER = 'categories'  
 
 @api_bp.route('/categories', methods=['GET'])
 @jwt_required()
+@conditional_get()
 def get_all_categories():
-    user_id = get_jwt_identity() 
-    user = User.query.get(user_id)  # Get the current logged-in user
-    categories = Category.query.all()
-    
-    category_list = []
-    for category in categories:
-        category_list.append({
-            "id": category.id,
-            "title": category.title,
-            "description": category.description,
-            "image_path": category.image_path,
-            "products": [
-                {
-                    "id": product.id,
-                    "name": product.name,
-                    "description": product.description,
-                    "price": product.price,
-                    "image_path": product.image_path,
-                    "rating": product.rating,
-                    "best_seller": product.best_seller,
-                    "is_favorite": product in user.favorite_products,
-                } for product in category.products  # Access related products
-            ]
-        })
+    limit, cursor, error = get_page_params()
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    fieldset, error = get_fieldset('category')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    # Home screen tiles ask for ?fields=id,title,images,product_count: one aggregated query, no products
+    with_products = fieldset is None or fieldset.wants('products')
+    with_count = fieldset is not None and 'product_count' in fieldset.fields
+
+    def build():
+        next_cursor = None
+        # Products are only queried when the client wants them
+        if limit is None:
+            if with_products and not with_count:
+                categories = category_rows()
+            else:
+                categories = fetch_rows(category_rows_query(with_count).order_by(Category.id))
+                if with_products:
+                    categories = category_rows(categories)
+        else:
+            categories, next_cursor = fetch_page(category_rows_query(with_count), Category.id, limit, cursor)
+            if with_products:
+                categories = category_rows(categories)
+        if not with_products:
+            categories = [(category, None) for category in categories]
+
+        category_list = []
+        for category, products in categories:
+            category_data = {
+                "id": category.id,
+                "title": category.title,
+                "description": category.description,
+                "image_path": category.image_path,
+                "images": image_variants(category.image_path),
+            }
+            if with_count:
+                category_data["product_count"] = category.product_count
+            if products is not None:
+                category_data["products"] = [
+                    {
+                        "id": product.id,
+                        "name": product.name,
+                        "description": product.description,
+                        "price": product.price,
+                        "image_path": product.image_path,
+                        "images": image_variants(product.image_path),
+                        "rating": product.rating,
+                        "best_seller": product.best_seller,
+                        "is_favorite": False,
+                    } for product in products
+                ]
+            category_list.append(category_data)
+        return category_list, next_cursor
+
+    category_list, next_cursor = cached_catalog(('categories', limit, cursor, with_products, with_count), build)
+    if with_products:
+        favorite_ids = get_favorite_ids(get_jwt_identity())
+        category_list = [
+            {**category, "products": with_favorites(category["products"], favorite_ids)}
+            for category in category_list
+        ]
+    category_list = project(fieldset, category_list)
 
     response = {
         "status": True,
         "categories": category_list
     }
+    if limit is not None:
+        response["next_cursor"] = next_cursor
     return jsonify(response), 200
 
+CATEGORY_PRODUCTS_PAGE_SIZE = 20
+PRODUCT_SORTS = {"id": None, "name": Product.name, "price": Product.price, "rating": Product.rating}
+
+
+@api_bp.route('/category/<int:id>/products', methods=['GET'])
+@jwt_required()
+@conditional_get()
+def get_category_products(id):
+    limit, cursor, error = get_page_params()
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    sort, descending, error = get_sort_param(PRODUCT_SORTS, 'id')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    fieldset, error = get_fieldset('product')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    limit = limit or CATEGORY_PRODUCTS_PAGE_SIZE  # Always paginated
+
+    def build():
+        if db.session.execute(db.select(Category.id).where(Category.id == id)).first() is None:
+            return None
+        products, next_cursor = fetch_page(product_rows_query().where(Product.category_id == id), Product.id,
+                                           limit, cursor, sort_column=PRODUCT_SORTS[sort], descending=descending)
+        return [format_product(product, ()) for product in products], next_cursor
+
+    page = cached_catalog(('category_products', id, limit, cursor, sort, descending), build)
+    if page is None:
+        return jsonify({"status": False, "message": "category not found"}), 404
+    products_list, next_cursor = page
+
+    return jsonify({
+        "status": True,
+        "products": project(fieldset, with_favorites(products_list, get_favorite_ids(get_jwt_identity()))),
+        "next_cursor": next_cursor,
+    }), 200
+
+
 @api_bp.route('/new_category', methods=['POST'])
 @jwt_required()
 def create_category():
@@ -50,10 +136,10 @@ def create_category():
     if not title or not description:
         return jsonify({"status": False, "message": "Title and description are required"}), 400
 
-    image_path = None
+    image_upload = None
     if 'image' in request.files:
         file = request.files['image']
-        image_path, error = process_image(file, CATEGORY_UPLOAD_FOLDER) 
+        image_upload, error = process_image(file, CATEGORY_UPLOAD_FOLDER) 
         
         if error:
             return jsonify({"message": error, "status": False}), 400 
@@ -61,13 +147,15 @@ def create_category():
         return jsonify({"status": False, "message": "Image is required"}), 400
     
 
-    category = Category(image_path=image_path, title=title, description=description)
+    category = Category(title=title, description=description)
     db.session.add(category)
+    schedule_upload(image_upload, category)  # Uploaded in the background once committed
     db.session.commit()
 
     return jsonify({
         "status": True,
-        "message": "Category created successfully"
+        "message": "Category created successfully",
+        "image_status": "pending"
     }), 201
 
 
@@ -98,20 +186,24 @@ def update_category(id):
         category.description = description
 
     if image:
-        image_path, error = process_image(image, CATEGORY_UPLOAD_FOLDER, category.image_path) 
+        image_upload, error = process_image(image, CATEGORY_UPLOAD_FOLDER) 
         if error:
             return jsonify({"message": error, "status": False}), 400 
         
-        category.image_path = image_path
+        schedule_upload(image_upload, category)
 
     db.session.commit()
 
-    return jsonify({"status": True, "message": "category updated successfully", "category": {
+    response = {"status": True, "message": "category updated successfully", "category": {
         "id": category.id,
         "title": category.title,
         "description": category.description,
-        "image_path": category.image_path
-    }}), 200
+        "image_path": category.image_path,
+        "images": image_variants(category.image_path)
+    }}
+    if image:
+        response["image_status"] = "pending"  # image_path still holds the previous image
+    return jsonify(response), 200
 
 
 @api_bp.route('/category/<int:id>', methods=['DELETE'])
@@ -131,9 +223,7 @@ def delete_category(id):
         return jsonify({"status": False, "message": "category not found"}), 404
 
     if category.image_path:
-        error = delete_image(category.image_path)
-        if error:
-            return jsonify({"message": error, "status": False}), 500
+        delete_image(category.image_path)  # Queued, removed from Cloudinary after commit
 
     db.session.delete(category)
     db.session.commit()
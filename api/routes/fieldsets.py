@@ -0,0 +1,112 @@
+import re
+from flask import request
+
+# Sparse fieldsets.
+# ?fields=id,name picks the fields of the returned resources, ?include=favorites
+# the nested collections to embed and ?fields[favorites]=id,name the fields of an
+# included collection. A response without fields or include keeps its full,
+# legacy shape; with either, only the asked-for fields and includes are
+# serialized and collections that are not included are not queried at all.
+
+# Fields of each resource as it is serialized where it appears
+PRODUCT_FIELDS = ('id', 'name', 'description', 'image_path', 'images', 'price', 'rating', 'best_seller',
+                  'is_favorite')
+FAVORITE_PRODUCT_FIELDS = ('id', 'name', 'description', 'price', 'image_path', 'images', 'rating', 'best_seller')
+ORDER_ITEM_FIELDS = ('id', 'name', 'description', 'image_path', 'images', 'rating', 'price', 'quantity',
+                     'total_price')
+CATEGORY_FIELDS = ('id', 'title', 'description', 'image_path', 'images')
+
+# resource -> (fields, {include: its resource})
+RESOURCES = {
+    'user': (('id', 'name', 'email', 'phone', 'image_path', 'images'), {'favorites': 'favorite_product'}),
+    'favorite_product': (FAVORITE_PRODUCT_FIELDS, {}),
+    'product': (PRODUCT_FIELDS, {'category': 'product_category'}),
+    'product_category': (CATEGORY_FIELDS, {}),
+    'category': (CATEGORY_FIELDS + ('product_count',), {'products': 'product'}),
+    'order': (('id', 'status', 'order_date', 'order_change_date', 'subtotal', 'tax', 'shipping', 'total', 'driver'),
+              {'items': 'order_item'}),
+    'order_item': (ORDER_ITEM_FIELDS, {}),
+}
+
+# Keys of the included collections in the legacy response shapes
+INCLUDE_KEYS = {'favorites': 'favorite_products'}
+
+_TYPED_FIELDS = re.compile(r'^fields\[(\w+)\]$')
+
+
+class Fieldset:
+    """The fields and includes a client asked for, see get_fieldset."""
+
+    def __init__(self, fields, includes):
+        self.fields = fields  # Field names
+        self.includes = includes  # Include name -> field names of the included resources
+
+    def wants(self, include):
+        return include in self.includes
+
+    def project(self, value):
+        """Reduce a serialized resource (or list of them) to the asked-for fields and includes."""
+        if isinstance(value, list):
+            return [self.project(item) for item in value]
+        projected = {key: item for key, item in value.items() if key in self.fields}
+        for include, fields in self.includes.items():
+            key = INCLUDE_KEYS.get(include, include)
+            if key in value:
+                projected[key] = _pick(value[key], fields)
+        return projected
+
+
+def _pick(value, fields):
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return [_pick(item, fields) for item in value]
+    return {key: item for key, item in value.items() if key in fields}
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def get_fieldset(resource):
+    """
+    Read the fields and include params of a resource from the query string.
+    Returns (fieldset, error); fieldset is None when the client asked for the legacy shape.
+    """
+    all_fields, includes = RESOURCES[resource]
+    fields = request.args.get('fields')
+    include = request.args.get('include')
+    typed = {}
+    for name, value in request.args.items():
+        match = _TYPED_FIELDS.match(name)
+        if match:
+            typed[match.group(1)] = value
+    if fields is None and include is None and not typed:
+        return None, None
+
+    fields = _split(fields) if fields is not None else list(all_fields)
+    unknown = [name for name in fields if name not in all_fields]
+    if unknown:
+        return None, f"Unknown field: {unknown[0]}. Valid fields are: {', '.join(all_fields)}"
+
+    include = _split(include) if include is not None else []
+    included = {}
+    for name in include + [name for name in typed if name not in include]:
+        if name not in includes:
+            valid = ', '.join(includes) or 'none'
+            return None, f"Unknown include: {name}. Valid includes are: {valid}"
+        if name not in include:
+            return None, f"fields[{name}] requires include={name}"
+        nested_fields = RESOURCES[includes[name]][0]
+        requested = _split(typed[name]) if name in typed else list(nested_fields)
+        unknown = [field for field in requested if field not in nested_fields]
+        if unknown:
+            return None, f"Unknown field of {name}: {unknown[0]}. Valid fields are: {', '.join(nested_fields)}"
+        included[name] = frozenset(requested)
+
+    return Fieldset(frozenset(fields), included), None
+
+
+def project(fieldset, value):
+    """Apply a fieldset from get_fieldset to a serialized value, None keeps it whole."""
+    return value if fieldset is None else fieldset.project(value)
@@ -0,0 +1,350 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import event
+
+from models import db, begin_write, ImageUpload, ImageDeletion, Product, Category, Slider, User
+from .storage import get_storage, hash_stream
+from metrics import record_image_upload
+
+# Background image upload pipeline.
+# process_image validates the file and spools it to local disk, schedule_upload
+# records an ImageUpload row bound to the target row, and once the request's
+# transaction commits the upload is handed to a bounded thread pool. The worker
+# stores the file on the configured storage backend (see storage.py) with retries
+# and writes the final URL onto the target row. No transaction stays open while
+# the storage backend is called, and the worker's writes start with begin_write.
+#
+# Remote deletions never run on the request path either: delete_image adds an
+# ImageDeletion row to the request's transaction and a per-process deletion
+# worker drains the queue in batches, backing off exponentially on failures.
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_TARGETS = {model.__tablename__: model for model in (Product, Category, Slider, User)}
+
+SNIFF_SIZE = 512
+INVALID_TYPE_MESSAGE = "Invalid file type. Allowed types are: png, jpg, jpeg."
+
+_executor = None
+_slots = None
+_queued = set()  # Upload ids waiting in or running on this process's pool
+_executor_lock = threading.Lock()
+
+DELETION_COALESCE_SECONDS = 1
+
+_deletion_worker = None
+_deletion_wakeup = threading.Event()
+
+
+def sniff_image_type(head):
+    """Return the file extension matching the magic bytes of an allowed image type, or None."""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    # SVG is not accepted: it can carry scripts and event handlers that run wherever the file is opened
+    return None
+
+
+def process_image(file, folder_name):
+    """
+    Validate an uploaded image by its magic bytes and stream it to local disk in chunks.
+    Returns (upload, error); pass the upload to schedule_upload once the target row exists.
+    """
+    try:
+        if not file:
+            return None, INVALID_TYPE_MESSAGE
+
+        # Check the real file type from its first bytes, the filename can't be trusted
+        head = file.stream.read(SNIFF_SIZE)
+        ext = sniff_image_type(head)
+        if not ext:
+            return None, INVALID_TYPE_MESSAGE
+
+        spool_dir = current_app.config['UPLOAD_SPOOL_DIR']
+        os.makedirs(spool_dir, exist_ok=True)
+        spool_path = os.path.join(spool_dir, f"{uuid.uuid4().hex}.{ext}")
+        content_hash = hash_stream(file.stream, spool_path, head)
+
+        return ImageUpload(folder=folder_name, spool_path=spool_path, content_hash=content_hash), None
+
+    except Exception as e:
+        # Return an error message if an exception occurs
+        return None, f"Error uploading file: {str(e)}"
+
+
+def schedule_upload(upload, instance):
+    """
+    Bind a spooled upload to the row that will hold its URL.
+    The upload starts in the background once the current transaction commits.
+    """
+    db.session.flush()  # Make sure the target row has an id
+    upload.target_table = instance.__tablename__
+    upload.target_id = instance.id
+    db.session.add(upload)
+    db.session.flush()
+
+    app = current_app._get_current_object()
+    upload_id = upload.id
+    event.listen(db.session(), 'after_commit', lambda session: submit_upload(app, upload_id), once=True)
+
+
+def _get_executor(app):
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = app.config['IMAGE_UPLOAD_WORKERS']
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-upload')
+            _slots = threading.BoundedSemaphore(workers + app.config['IMAGE_UPLOAD_QUEUE_SIZE'])
+    return _executor
+
+
+def submit_upload(app, upload_id):
+    """Queue an upload on the worker pool; when the pool is full it stays pending for a later pickup."""
+    executor = _get_executor(app)
+    with _executor_lock:
+        if upload_id in _queued:
+            return False
+        if not _slots.acquire(blocking=False):
+            logger.warning("Image upload queue is full, upload %s left pending", upload_id)
+            return False
+        _queued.add(upload_id)
+    executor.submit(_run_upload, app, upload_id)
+    return True
+
+
+def _claim(upload_id):
+    # Atomically move pending -> uploading so only one worker (in any process) runs an upload.
+    # Returns the upload detached from the session, or None when another worker has it.
+    begin_write()
+    result = db.session.execute(
+        db.update(ImageUpload)
+        .where(ImageUpload.id == upload_id, ImageUpload.status == 'pending')
+        .values(status='uploading')
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return None
+    upload = db.session.get(ImageUpload, upload_id)
+    db.session.expunge(upload)
+    db.session.commit()
+    return upload
+
+
+def _upload_with_retries(app, upload):
+    retries = app.config['IMAGE_UPLOAD_RETRIES']
+    storage = get_storage(app)
+    ext = upload.spool_path.rsplit('.', 1)[1]
+    last_error = None
+    for attempt in range(retries):
+        upload.attempts += 1
+        try:
+            return storage.save(upload.spool_path, upload.folder, upload.content_hash, ext), None
+        except Exception as e:
+            last_error = str(e)
+            logger.warning("Image upload %s failed (attempt %s/%s): %s", upload.id, attempt + 1, retries, e)
+            if attempt + 1 < retries:
+                time.sleep(2 ** attempt)
+    return None, last_error
+
+
+def _run_upload(app, upload_id):
+    try:
+        with app.app_context():
+            upload = _claim(upload_id)
+            if upload is None:
+                return
+            started = time.perf_counter()
+            image_url, error = _upload_with_retries(app, upload)
+            record_image_upload(time.perf_counter() - started, 'failed' if error else 'done')
+
+            begin_write()
+            upload = db.session.merge(upload)  # Keeps the attempts counted while detached
+
+            if error:
+                upload.status = 'failed'
+                upload.error = f"Error uploading file: {error}"[:255]
+                db.session.commit()
+                os.remove(upload.spool_path)
+                return
+
+            upload.status = 'done'
+            upload.image_url = image_url
+
+            # Only the most recent upload for a row may set its image
+            latest_id = db.session.execute(
+                db.select(db.func.max(ImageUpload.id)).where(
+                    ImageUpload.target_table == upload.target_table,
+                    ImageUpload.target_id == upload.target_id,
+                )
+            ).scalar()
+            target = db.session.get(UPLOAD_TARGETS[upload.target_table], upload.target_id)
+            if target is not None and latest_id == upload.id:
+                stale_image_url = target.image_path
+                target.image_path = image_url
+            else:
+                # Superseded by a newer upload or the row is gone, drop the new file instead
+                stale_image_url = image_url
+                image_url = None
+
+            # Delete the replaced image now that the row points at the new one
+            # (identical content resolves to the same URL, which must be kept)
+            if stale_image_url and stale_image_url != image_url:
+                delete_image(stale_image_url)
+            db.session.commit()
+
+            if os.path.exists(upload.spool_path):
+                os.remove(upload.spool_path)
+    except Exception:
+        logger.exception("Image upload %s crashed", upload_id)
+    finally:
+        with _executor_lock:
+            _queued.discard(upload_id)
+            _slots.release()
+        _pick_up_pending(app)
+
+
+def _pick_up_pending(app):
+    """Feed the pool with the oldest uploads that were left pending when it was full."""
+    with app.app_context():
+        with _executor_lock:
+            queued = list(_queued)
+        pending = db.session.execute(
+            db.select(ImageUpload.id)
+            .where(ImageUpload.status == 'pending', ImageUpload.id.not_in(queued))
+            .order_by(ImageUpload.id)
+            .limit(1)
+        ).scalars().all()
+    for upload_id in pending:
+        submit_upload(app, upload_id)
+
+
+def resume_pending_uploads(app, stale_after=600):
+    """Requeue pending uploads and uploads stuck in 'uploading' (e.g. after a worker restart)."""
+    with app.app_context():
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=stale_after)
+        begin_write()
+        db.session.execute(
+            db.update(ImageUpload)
+            .where(ImageUpload.status == 'uploading', ImageUpload.updated_at < cutoff)
+            .values(status='pending')
+        )
+        db.session.commit()
+        pending = db.session.execute(
+            db.select(ImageUpload.id).where(ImageUpload.status == 'pending').order_by(ImageUpload.id)
+        ).scalars().all()
+    return sum(submit_upload(app, upload_id) for upload_id in pending)
+
+
+def delete_image(image_url):
+    """
+    Queue a remote image for deletion in the current transaction.
+    The deletion worker removes it once the transaction commits.
+    """
+    db.session.add(ImageDeletion(image_url=image_url, public_id=get_storage().key_from_url(image_url)))
+
+    app = current_app._get_current_object()
+    event.listen(db.session(), 'after_commit', lambda session: wake_deletion_worker(app), once=True)
+
+
+def wake_deletion_worker(app):
+    """Start this process's deletion worker if needed and have it scan the queue now."""
+    global _deletion_worker
+    with _executor_lock:
+        if _deletion_worker is None or not _deletion_worker.is_alive():
+            _deletion_worker = threading.Thread(
+                target=_deletion_loop, args=(app,), name='image-deletion', daemon=True
+            )
+            _deletion_worker.start()
+    _deletion_wakeup.set()
+
+
+def _deletion_loop(app):
+    while True:
+        if _deletion_wakeup.wait(app.config['IMAGE_DELETE_INTERVAL']):
+            time.sleep(DELETION_COALESCE_SECONDS)  # Let a burst of deletions share one batch
+        _deletion_wakeup.clear()
+        try:
+            with app.app_context():
+                while drain_image_deletions(app) == app.config['IMAGE_DELETE_BATCH_SIZE']:
+                    pass
+        except Exception:
+            logger.exception("Image deletion worker failed")
+
+
+def _claim_deletions(app, now):
+    # Lease a batch of due rows by pushing next_attempt_at forward, so other processes skip them.
+    # Returns (id, image_url, public_id) of the leased rows and the urls still in use.
+    lease_until = now + timedelta(seconds=app.config['IMAGE_DELETE_INTERVAL'] * 2)
+    begin_write()
+    due_ids = db.session.execute(
+        db.select(ImageDeletion.id)
+        .where(ImageDeletion.next_attempt_at <= now)
+        .order_by(ImageDeletion.id)
+        .limit(app.config['IMAGE_DELETE_BATCH_SIZE'])
+    ).scalars().all()
+    if not due_ids:
+        db.session.rollback()
+        return [], set()
+    db.session.execute(
+        db.update(ImageDeletion)
+        .where(ImageDeletion.id.in_(due_ids), ImageDeletion.next_attempt_at <= now)
+        .values(next_attempt_at=lease_until)
+    )
+    leased = db.session.execute(
+        db.select(ImageDeletion.id, ImageDeletion.image_url, ImageDeletion.public_id)
+        .where(ImageDeletion.id.in_(due_ids), ImageDeletion.next_attempt_at == lease_until)
+    ).all()
+    # Content-addressed files can be shared, keep any image a row still points at
+    in_use = still_referenced({row.image_url for row in leased}) if leased else set()
+    db.session.commit()
+    return leased, in_use
+
+
+def still_referenced(image_urls):
+    """Return the subset of image_urls that some row's image_path still points at."""
+    in_use = set()
+    for model in UPLOAD_TARGETS.values():
+        in_use.update(db.session.execute(
+            db.select(model.image_path).where(model.image_path.in_(image_urls))
+        ).scalars())
+    return in_use
+
+
+def drain_image_deletions(app):
+    """Delete one batch of due images with a single storage call, returns the batch size."""
+    now = datetime.now(timezone.utc)
+    leased, in_use = _claim_deletions(app, now)
+    if not leased:
+        return 0
+
+    keys = {row.public_id for row in leased if row.image_url not in in_use}
+    try:
+        gone = get_storage(app).delete_many(keys) if keys else set()
+        error = None
+    except Exception as e:
+        gone = set()
+        error = f"Error deleting image: {str(e)}"
+
+    begin_write()
+    deletions = db.session.execute(
+        db.select(ImageDeletion).where(ImageDeletion.id.in_([row.id for row in leased]))
+    ).scalars().all()
+    for deletion in deletions:
+        if deletion.image_url in in_use or deletion.public_id in gone:
+            db.session.delete(deletion)
+            continue
+        deletion.attempts += 1
+        deletion.last_error = (error or "Error deleting image: not deleted")[:255]
+        backoff = min(2 ** deletion.attempts * 10, app.config['IMAGE_DELETE_MAX_BACKOFF'])
+        deletion.next_attempt_at = now + timedelta(seconds=backoff)
+        logger.warning("Deleting %s failed (attempt %s): %s", deletion.public_id, deletion.attempts, deletion.last_error)
+    db.session.commit()
+    return len(leased)
@@ -0,0 +1,20 @@
+from flask import jsonify
+from .. import api_bp
+from models import db
+from db_pool import pool_stats
+from cache import catalog_cache
+from identity import user_cache
+from decorator import internal_only
+
+# Operational stats of this worker process, for monitoring
+
+
+@api_bp.route('/internal/stats', methods=['GET'])
+@internal_only
+def get_internal_stats():
+    return jsonify({
+        "status": True,
+        "pool": pool_stats(db.engine),
+        "catalog_cache": catalog_cache.stats(),
+        "user_cache": user_cache.stats(),
+    }), 200
@@ -0,0 +1,20 @@
+import posixpath
+from flask import current_app, send_from_directory, jsonify
+from .. import api_bp
+
+# Content-addressed files never change, so clients may cache them for good
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+
+@api_bp.route('/media/<path:filename>', methods=['GET'])
+def get_media(filename):
+    # Only served when images are stored on the local filesystem backend
+    if current_app.config['IMAGE_STORAGE'] != 'local':
+        return jsonify({"status": False, "message": "Not found"}), 404
+
+    response = send_from_directory(current_app.config['LOCAL_STORAGE_DIR'], filename, max_age=MEDIA_MAX_AGE)
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    if response.mimetype == 'image/svg+xml':
+        # SVG can carry scripts that would run on the API's origin: never render it inline here
+        response.headers['Content-Security-Policy'] = 'sandbox'
+        response.headers.set('Content-Disposition', 'attachment', filename=posixpath.basename(filename))
+    return response
@@ -1,10 +1,22 @@
 from flask import request, jsonify
 from .. import api_bp
 from models import Order, db, OrderItem, Product
-from .shared_functions import process_image, delete_image
+from .shared_functions import get_page_params, keyset_paginate, paginate_rows
+from .storage import image_variants
+from .fieldsets import get_fieldset, project
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import selectinload
 from datetime import datetime, timezone
 
+def parse_product_id(item):
+    """Return the integer product id of an order line, or None if it is missing or invalid."""
+    product_id = item.get("product_id") if isinstance(item, dict) else None
+    if isinstance(product_id, str) and product_id.isdigit():
+        return int(product_id)
+    if isinstance(product_id, int) and not isinstance(product_id, bool):
+        return product_id
+    return None
+
 @api_bp.route('/place_order', methods=['POST'])
 @jwt_required()
 def place_order():
@@ -18,26 +30,30 @@ def place_order():
     if not isinstance(items, list) or len(items) == 0:
         return jsonify({"status": False, "message": "No items in order"}), 400
 
-    subtotal = 0
-    order_items = []
+    # Resolve every product of the cart with a single IN query
+    product_ids = [parse_product_id(item) for item in items]
+    lookup_ids = [product_id for product_id in product_ids if product_id is not None]
+    products = {
+        product.id: product
+        for product in db.session.execute(
+            db.select(Product.id, Product.name, Product.price).where(Product.id.in_(lookup_ids))
+        )
+    }
 
-    for item in items:
-        product = Product.query.get(item.get("product_id"))
+    # Validate every line before writing anything, merging duplicate products
+    quantities = {}
+    for item, product_id in zip(items, product_ids):
+        product = products.get(product_id)
         if not product:
-            return jsonify({"status": False, "message": f"Product ID {item.get('product_id')} not found"}), 404
-        
+            return jsonify({"status": False, "message": f"Product ID {item.get('product_id') if isinstance(item, dict) else None} not found"}), 404
+
         quantity = item.get("quantity", 1)
-        if quantity <= 0:
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
             return jsonify({"status": False, "message": f"Invalid quantity for product {product.name}"}), 400
-        
-        item_total = product.price * quantity
-        subtotal += item_total
 
-        order_items.append(OrderItem(
-            product_id=product.id,
-            quantity=quantity,
-            current_unit_price=product.price
-        ))
+        quantities[product.id] = quantities.get(product.id, 0) + quantity
+
+    subtotal = sum(products[product_id].price * quantity for product_id, quantity in quantities.items())
 
     # Example tax & shipping calculation (can be customized)
     tax = 0  
@@ -55,85 +71,145 @@ def place_order():
         total=total
     )
 
-    db.session.add(new_order)
-    db.session.flush()  # Ensure order gets an ID before adding items
+    try:
+        db.session.add(new_order)
+        db.session.flush()  # Ensure order gets an ID before adding items
+        order_id = new_order.id  # Read before commit expires the instance
 
-    # Assign the correct order_id to each order item and save them
-    for order_item in order_items:
-        order_item.order_id = new_order.id
-        db.session.add(order_item)
-
-    db.session.commit()
+        # Insert all order items in one executemany
+        db.session.execute(OrderItem.__table__.insert(), [
+            {
+                "order_id": order_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "current_unit_price": products[product_id].price
+            } for product_id, quantity in quantities.items()
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
 
     return jsonify({
         "status": True,
         "message": "Order placed successfully",
-        "order_id": new_order.id,
+        "order_id": order_id,
         "total": total
     }), 201
     
     
     
+ORDER_STATUSES = {"active": 0, "completed": 1, "canceled": 2}
+
+
+def user_orders_query(user_id, items=True):
+    """Select a user's orders with their items and products eager-loaded (3 queries in total, 1 without items)."""
+    stmt = db.select(Order).where(Order.user_id == user_id)
+    if items:
+        stmt = stmt.options(selectinload(Order.order_items).selectinload(OrderItem.product))
+    return stmt
+
+
+def format_order(order, items=True):
+    """Helper function to format order data."""
+    order_data = {
+        "id": order.id,
+        "status": order.status,
+        "order_date": order.order_date,
+        "order_change_date": order.order_change_date,
+        "subtotal": order.subtotal,
+        "tax": order.tax,
+        "shipping": order.shipping,
+        "total": order.total,
+        "driver": {
+            "name": "Wael Mohamed",
+            "phone": "01008965412",
+            "longitude": 30.5878153960647, 
+            "latitude": 31.479659660063422
+        },
+    }
+    if items:
+        order_data["items"] = [
+            {
+                "id": item.product.id,
+                "name": item.product.name,
+                "description": item.product.description,
+                "image_path": item.product.image_path,
+                "images": image_variants(item.product.image_path),
+                "rating": item.product.rating,
+                "price": item.current_unit_price,
+                "quantity": item.quantity,
+                "total_price": item.quantity * item.current_unit_price
+            }
+            for item in order.order_items
+        ]
+    return order_data
+
+
 @api_bp.route('/orders', methods=['GET'])
 @jwt_required()
 def get_user_orders():
     user_id = get_jwt_identity()  # Get logged-in user ID
 
+    limit, cursor, error = get_page_params()
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    fieldset, error = get_fieldset('order')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    with_items = fieldset is None or fieldset.wants('items')
+
+    stmt = user_orders_query(user_id, with_items)
+
+    status = request.args.get('status')
+    if status is not None:
+        if status not in ORDER_STATUSES:
+            return jsonify({"status": False, "message": "status must be one of: active, completed, canceled"}), 400
+        stmt = stmt.where(Order.status == ORDER_STATUSES[status])
+
     # Fetch orders categorized by status
-    orders = Order.query.filter_by(user_id=user_id).all()
-    if not orders:
-        return jsonify({"status": True,  "orders": {
-            "active": [],
-            "completed": [],
-            "canceled": []
-        }}), 200
-
-    def format_order(order):
-        """Helper function to format order data."""
-        return {
-            "id": order.id,
-            "status": order.status,
-            "order_date": order.order_date,
-            "order_change_date": order.order_change_date,
-            "subtotal": order.subtotal,
-            "tax": order.tax,
-            "shipping": order.shipping,
-            "total": order.total,
-            "driver": {
-                "name": "Wael Mohamed",
-                "phone": "01008965412",
-                "longitude": 30.5878153960647, 
-                "latitude": 31.479659660063422
-            },
-            "items": [
-                {
-                    "id": item.product.id,
-                    "name": item.product.name,
-                    "description": item.product.description,
-                    "image_path": item.product.image_path,
-                    "rating": item.product.rating,
-                    "price": item.current_unit_price,
-                    "quantity": item.quantity,
-                    "total_price": item.quantity * item.current_unit_price
-                }
-                for item in order.order_items
-            ]
-        }
+    if limit is None:
+        orders = db.session.scalars(stmt.order_by(Order.id)).all()
+    else:
+        stmt = keyset_paginate(stmt, Order.id, limit, cursor)
+        orders, next_cursor = paginate_rows(db.session.scalars(stmt).all(), limit)
 
     # Categorize orders
-    active_orders = [format_order(order) for order in orders if order.status == 0]
-    completed_orders = [format_order(order) for order in orders if order.status == 1]
-    canceled_orders = [format_order(order) for order in orders if order.status == 2]
+    categorized = {name: [] for name in ORDER_STATUSES}
+    status_names = {value: name for name, value in ORDER_STATUSES.items()}
+    for order in orders:
+        if order.status in status_names:
+            categorized[status_names[order.status]].append(project(fieldset, format_order(order, with_items)))
+
+    response = {
+        "status": True,
+        "orders": categorized
+    }
+    if limit is not None:
+        response["next_cursor"] = next_cursor
+    return jsonify(response), 200
+
+
+@api_bp.route('/orders/<int:order_id>', methods=['GET'])
+@jwt_required()
+def get_user_order(order_id):
+    user_id = get_jwt_identity()
+    fieldset, error = get_fieldset('order')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    with_items = fieldset is None or fieldset.wants('items')
+
+    order = db.session.scalars(user_orders_query(user_id, with_items).where(Order.id == order_id)).first()
+
+    if not order:
+        return jsonify({"status": False, "message": "Order not found"}), 404
 
     return jsonify({
         "status": True,
-        "orders": {
-            "active": active_orders,
-            "completed": completed_orders,
-            "canceled": canceled_orders
-        }
+        "order": project(fieldset, format_order(order, with_items))
     }), 200
 
+
 @api_bp.route('/orders/cancel/<int:order_id>', methods=['POST'])
 @jwt_required()
 def cancel_order(order_id):
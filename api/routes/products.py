@@ -1,11 +1,21 @@
+import math
 from flask import request, jsonify
+from datetime import datetime, timezone
 from .. import api_bp
-from models import Product, db, User, Category
-from .shared_functions import process_image, delete_image
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import Product, db, Category
+from .shared_functions import get_favorite_ids, get_page_params, get_sort_param, keyset_order, fetch_page
+from .images import process_image, schedule_upload, delete_image
+from .catalog import (product_rows_query, fetch_rows, format_product, product_filter_conditions,
+                      facet_counts_query, format_facets)
+from .fieldsets import get_fieldset, project
+from search import apply_search
+from cache import cached_catalog, with_favorites
+from decorator import conditional_get
+from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
 
 PRODUCT_UPLOAD_FOLDER = 'products'  
 
+
 @api_bp.route('/new_product', methods=['POST'])
 @jwt_required()
 def create_product():
@@ -42,35 +52,35 @@ def create_product():
         category_id = int(category_id)
     except ValueError:
         return jsonify({"status": False, "message": "Category id must be an integer number"}), 400
-    image_path = None
-    if 'image' in request.files:
-        file = request.files['image']
-        image_path, error = process_image(file, PRODUCT_UPLOAD_FOLDER) 
-        
-        if error:
-            return jsonify({"message": error, "status": False}), 400 
-    else:
+    if 'image' not in request.files:
         return jsonify({"status": False, "message": "Image is required"}), 400
-    
+
     # check if category exists
     category = Category.query.get(category_id)
     if not category:
         return jsonify({"status": False, "message": "Category not found"}), 404
 
-    product = Product(category_id=category_id , image_path=image_path, name=name, description=description, price=price, rating=rating, best_seller=best_seller)
+    file = request.files['image']
+    image_upload, error = process_image(file, PRODUCT_UPLOAD_FOLDER) 
+    
+    if error:
+        return jsonify({"message": error, "status": False}), 400 
+
+    product = Product(category_id=category_id , name=name, description=description, price=price, rating=rating, best_seller=best_seller)
     db.session.add(product)
+    schedule_upload(image_upload, product)  # Uploaded in the background once committed
     db.session.commit()
 
     return jsonify({
         "status": True,
-        "message": "product created successfully"
+        "message": "product created successfully",
+        "image_status": "pending"
     }), 201
 
 @api_bp.route('/add_to_favorite', methods=['POST'])
 @jwt_required()
 def add_to_favorite():
-    user_id = get_jwt_identity() 
-    user = User.query.get(user_id)  # Get the current logged-in user
+    user = current_user
     product_id = request.form.get('product_id', '')
     
     if not product_id:
@@ -89,97 +99,151 @@ def add_to_favorite():
         return jsonify({"status": False, "message": "Product already in favorites"}), 400
 
     user.favorite_products.append(product)
+    user.updated_at = datetime.now(timezone.utc)  # Favorites are part of the user's ETag
     db.session.commit()
 
     return jsonify({"status": True, "message": "Product added to favorites"}), 200
 
+PRODUCT_SORTS = {"id": None, "newest": None, "price": Product.price, "rating": Product.rating}
+BOOLEAN_VALUES = {"1": 1, "true": 1, "0": 0, "false": 0}
+
+
+def _number(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    value = float(value)  # ValueError for the caller
+    if not math.isfinite(value):
+        raise ValueError
+    return value
+
+
+def get_product_filters():
+    """
+    Read the /products filters from the query string.
+    Returns (filters, error); filters only holds the filters that were given.
+    """
+    filters = {}
+    category_ids = request.args.get('category_id')
+    if category_ids:
+        try:
+            filters['category_ids'] = tuple(sorted({int(value) for value in category_ids.split(',')}))
+        except ValueError:
+            return None, "category_id must be an integer or a comma-separated list of integers"
+    for name in ('min_price', 'max_price', 'min_rating'):
+        try:
+            value = _number(name)
+        except ValueError:
+            return None, f"{name} must be a number"
+        if value is not None:
+            filters[name] = value
+    best_seller = request.args.get('best_seller')
+    if best_seller is not None:
+        if best_seller.lower() not in BOOLEAN_VALUES:
+            return None, "best_seller must be 0 or 1"
+        filters['best_seller'] = BOOLEAN_VALUES[best_seller.lower()]
+    return filters, None
+
+
 @api_bp.route('/products', methods=['GET'])
 @jwt_required()
+@conditional_get()
 def get_all_products():
     user_id = get_jwt_identity() 
-    user = User.query.get(user_id)  # Get the current logged-in user
-    products = Product.query.all()
-    
-    products_list = list(map(lambda product: {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "image_path": product.image_path,
-        "price": product.price,
-        "rating": product.rating,
-        "best_seller": product.best_seller,
-        "is_favorite": product in user.favorite_products,
-        "category": {
-            "id": product.category.id,
-            "title": product.category.title,
-            "description": product.category.description,
-            "image_path": product.category.image_path
-        } if product.category else None,  # Handle missing category gracefully
-    }, products))
+    favorite_ids = get_favorite_ids(user_id)
+    limit, cursor, error = get_page_params()
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    fieldset, error = get_fieldset('product')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    filters, error = get_product_filters()
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    sort, descending, error = get_sort_param(PRODUCT_SORTS, 'id')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    if sort == 'newest':
+        descending = not descending  # Newest first, '-newest' for oldest first
+    filters_key = tuple(sorted(filters.items()))
+
+    def build():
+        next_cursor = None
+        stmt = product_rows_query().where(*product_filter_conditions(filters))
+        if limit is None:
+            products = fetch_rows(keyset_order(stmt, Product.id, PRODUCT_SORTS[sort], descending))
+        else:
+            products, next_cursor = fetch_page(stmt, Product.id, limit, cursor,
+                                               sort_column=PRODUCT_SORTS[sort], descending=descending)
+        return [format_product(product, ()) for product in products], next_cursor
+
+    products_list, next_cursor = cached_catalog(('products', limit, cursor, filters_key, sort, descending), build)
+    products_list = project(fieldset, with_favorites(products_list, favorite_ids))
 
     response = {
         "status": True,
         "products": products_list
     }
+    if limit is not None:
+        response["next_cursor"] = next_cursor
+    # Facets come with filtered listings, or on request for the whole catalog
+    if filters or request.args.get('facets', '').lower() in ('1', 'true'):
+        response["facets"] = cached_catalog(
+            ('product_facets', filters_key), lambda: format_facets(fetch_rows(facet_counts_query(filters)))
+        )
     return jsonify(response), 200
 
 @api_bp.route('/top_rated_products', methods=['GET'])
 @jwt_required()
+@conditional_get()
 def get_top_rated_products():
     user_id = get_jwt_identity() 
-    user = User.query.get(user_id)  # Get the current logged-in user
-
-    # Fetch top 2 highest-rated products
-    products = Product.query.order_by(Product.rating.desc()).limit(2).all()
-    
-    products_list = list(map(lambda product: {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "image_path": product.image_path,
-        "price": product.price,
-        "rating": product.rating,
-        "best_seller": product.best_seller,
-        "is_favorite": product in user.favorite_products,
-        "category": {
-            "id": product.category.id,
-            "title": product.category.title,
-            "description": product.category.description,
-            "image_path": product.category.image_path
-        } if product.category else None,  # Handle missing category gracefully
-    }, products))
+    favorite_ids = get_favorite_ids(user_id)
+    limit, cursor, error = get_page_params()
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    fieldset, error = get_fieldset('product')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+
+    def build():
+        next_cursor = None
+        if limit is None:
+            # Fetch top 2 highest-rated products
+            products = fetch_rows(product_rows_query().order_by(Product.rating.desc().nulls_last(), Product.id.desc()).limit(2))
+        else:
+            # Page through all products by rating
+            products, next_cursor = fetch_page(product_rows_query(), Product.id, limit, cursor,
+                                               sort_column=Product.rating, descending=True)
+        return [format_product(product, ()) for product in products], next_cursor
+
+    products_list, next_cursor = cached_catalog(('top_rated_products', limit, cursor), build)
+    products_list = project(fieldset, with_favorites(products_list, favorite_ids))
 
     response = {
         "status": True,
         "products": products_list
     }
+    if limit is not None:
+        response["next_cursor"] = next_cursor
     return jsonify(response), 200
 
 @api_bp.route('/best_seller_products', methods=['GET'])
 @jwt_required()
+@conditional_get()
 def get_best_seller_products():
     user_id = get_jwt_identity() 
-    user = User.query.get(user_id)  # Get the current logged-in user
-
-    # Fetch top 2 highest-rated products
-    products = Product.query.filter_by(best_seller=1).all()
-    
-    products_list = list(map(lambda product: {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "image_path": product.image_path,
-        "price": product.price,
-        "rating": product.rating,
-        "best_seller": product.best_seller,
-        "is_favorite": product in user.favorite_products,
-        "category": {
-            "id": product.category.id,
-            "title": product.category.title,
-            "description": product.category.description,
-            "image_path": product.category.image_path
-        } if product.category else None,  # Handle missing category gracefully
-    }, products))
+    favorite_ids = get_favorite_ids(user_id)
+    fieldset, error = get_fieldset('product')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+
+    # Fetch all best seller products
+    products_list = cached_catalog(('best_seller_products',), lambda: [
+        format_product(product, ())
+        for product in fetch_rows(product_rows_query().where(Product.best_seller == 1).order_by(Product.id))
+    ])
+    products_list = project(fieldset, with_favorites(products_list, favorite_ids))
 
     response = {
         "status": True,
@@ -242,15 +306,18 @@ def update_product(id):
         product.rating = rating
 
     if image:
-        image_path, error = process_image(image, PRODUCT_UPLOAD_FOLDER, product.image_path) 
+        image_upload, error = process_image(image, PRODUCT_UPLOAD_FOLDER) 
         if error:
             return jsonify({"message": error, "status": False}), 400 
         
-        product.image_path = image_path
+        schedule_upload(image_upload, product)
 
     db.session.commit()
 
-    return jsonify({"status": True, "message": "product updated successfully"}), 200
+    response = {"status": True, "message": "product updated successfully"}
+    if image:
+        response["image_status"] = "pending"
+    return jsonify(response), 200
 
 
 @api_bp.route('/product/<int:id>', methods=['DELETE'])
@@ -270,9 +337,7 @@ def delete_product(id):
         return jsonify({"status": False, "message": "product not found"}), 404
 
     if product.image_path:
-        error = delete_image(product.image_path)
-        if error:
-            return jsonify({"message": error, "status": False}), 500
+        delete_image(product.image_path)  # Queued, removed from Cloudinary after commit
 
     # Delete the slider from the database
     db.session.delete(product)
@@ -284,35 +349,36 @@ def delete_product(id):
 @jwt_required()
 def search_products():
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)  # Get the current logged-in user
+    favorite_ids = get_favorite_ids(user_id)
 
     search_query = request.args.get('q', '').strip()  # Get search query from URL parameters
 
     if not search_query:
         return jsonify({"status": False, "message": "Search query is required"}), 400
 
-    # Case-insensitive search using ILIKE
-    products = Product.query.filter(Product.name.ilike(f"%{search_query}%")).all()
-
-    products_list = list(map(lambda product: {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "image_path": product.image_path,
-        "price": product.price,
-        "rating": product.rating,
-        "best_seller": product.best_seller,
-        "is_favorite": product in user.favorite_products,
-        "category": {
-            "id": product.category.id,
-            "title": product.category.title,
-            "description": product.category.description,
-            "image_path": product.category.image_path
-        } if product.category else None,
-    }, products))
+    limit, cursor, error = get_page_params()
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+    fieldset, error = get_fieldset('product')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+
+    # Relevance-ranked full-text search over name and description
+    stmt, rank, descending = apply_search(product_rows_query(), search_query)
+    if limit is None:
+        if rank is not None:
+            stmt = stmt.order_by(rank.desc() if descending else rank.asc())
+        products = fetch_rows(stmt.order_by(Product.id))
+    else:
+        products, next_cursor = fetch_page(stmt, Product.id, limit, cursor,
+                                           sort_column=rank, descending=descending)
+
+    products_list = project(fieldset, [format_product(product, favorite_ids) for product in products])
 
     response = {
         "status": True,
         "products": products_list
     }
+    if limit is not None:
+        response["next_cursor"] = next_cursor
     return jsonify(response), 200
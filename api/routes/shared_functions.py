@@ -1,20 +1,9 @@
-import os
-import datetime
-import random
-from werkzeug.utils import secure_filename
-
-
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-
-# Cloudinary configuration
-cloudinary.config(
-    cloud_name='dhttlveht',
-    api_key='857596579443741',
-    api_secret='fAN3CUpLcXaVzoE-i4r42aa5veA',
-    secure=True
-)
+import json
+import operator
+import base64
+from flask import request
+from sqlalchemy import asc, desc, or_, and_
+from models import db, favorites
 
  # ID
  # Feature          ID
@@ -29,117 +18,130 @@ cloudinary.config(
 valid_features = ["users", "sliders", "questions", "colors", "sizes", "materials", "products", "services", "settings", "phones", "emails", "locations", "inquiries"] 
 valid_actions = ["view", "add", "edit", "delete"]
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'svg'}
-
-
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-
-
-def delete_image(image_url):
-    try:
-        # Extract the public ID from the URL
-        url_parts = image_url.split('/')
-        #file_name = image_url.rsplit('/', 1)[-1].split('.')[0]
-        folder_name = url_parts[-2]
-        file_name_with_ext = url_parts[-1]
-        
-        # Remove the file extension from the file name
-        file_name = file_name_with_ext.split('.')[0]
-
-        print(f"Deleting image with folder name: {folder_name}")
-        public_id = f"{folder_name}/{file_name}"
-        print(f"Deleting image with public ID: {public_id}")
-        delete_result = cloudinary.uploader.destroy(public_id)
-        print(delete_result)
-
-        return None  # Success
-    except Exception as e:
-        return f"Error deleting image: {str(e)}"
-
-
-def process_image(file, folder_name, old_image_url=None):
-    try:
-        # Check if the file has a valid extension
-        if not file or not allowed_file(file.filename):
-            return None, "Invalid file type. Allowed types are: png, jpg, jpeg."
-
-        # Upload the file to Cloudinary
-        upload_result = cloudinary.uploader.upload(file, folder=folder_name)
-
-        # Delete the old image if provided
-        if old_image_url:
-            error = delete_image(old_image_url)
-            if error:
-                return None, error
+MAX_PAGE_SIZE = 100
 
 
-        # Return the secure URL of the uploaded image
-        return upload_result.get("secure_url"), None
 
-    except Exception as e:
-        # Return an error message if an exception occurs
-        return None, f"Error uploading file: {str(e)}"
+def get_favorite_ids(user_id):
+    """Return the set of product ids the user marked as favorite (one query)."""
+    rows = db.session.execute(
+        db.select(favorites.c.product_id).where(favorites.c.user_id == user_id)
+    )
+    return {product_id for (product_id,) in rows}
 
 
+def encode_cursor(sort_value, row_id):
+    """Encode the (sort key, id) of the last row of a page as an opaque cursor."""
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
 
 
-
-
-
-
-
-
-
-
-'''def delete_image(image_path):
-    try:
-        if os.path.exists(image_path):
-            os.remove(image_path)
-    except Exception as e:
-        return f"Error deleting image: {str(e)}"
-
-    
-def process_image(file, UPLOAD_FOLDER, old_image_path=None):
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, returns None if it is malformed."""
     try:
-        if not os.path.exists(UPLOAD_FOLDER):
-            os.makedirs(UPLOAD_FOLDER)
-
-        # Check if file has a valid extension
-        if not file or not allowed_file(file.filename):
-            return None, "Invalid file type. Allowed types are: png, jpg, jpeg."
-        
-        # Generate a secure and unique filename
-        original_filename = secure_filename(file.filename)
-        name, ext = original_filename.rsplit('.', 1)
-        
-        # Append timestamp to the filename to make it unique
-        timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-        filename = f"{name}_{timestamp}.{ext}"
-        print(filename)
-        
-        # Ensure the filename is unique by appending a random number if the filename already exists
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        while os.path.exists(file_path):
-            filename = f"{name}_{timestamp}_{random.randint(1000, 9999)}.{ext}"
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-        # Save the file
-        file.save(file_path)
-
-        if old_image_path:
-            error = delete_image(old_image_path)
-            if error:
-                return None, error
-        
-
-        return file_path, None  # Successfully saved
-
-    except Exception as e:
-        # Return an error message if an exception occurs
-        return None, f"Error saving file: {str(e)}"
-'''
-
-
-
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(row_id, int) or isinstance(sort_value, (list, dict)):
+        return None
+    return sort_value, row_id
+
+
+def get_page_params():
+    """
+    Read the opt-in keyset pagination params from the query string.
+    Returns (limit, cursor, error); limit is None when the client did not ask for a page.
+    """
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        return None, None, None
+
+    if limit is None:
+        limit = MAX_PAGE_SIZE
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return None, None, "limit must be an integer"
+        if limit <= 0:
+            return None, None, "limit must be a positive integer"
+        limit = min(limit, MAX_PAGE_SIZE)
+
+    if cursor:
+        cursor = decode_cursor(cursor)
+        if cursor is None:
+            return None, None, "Invalid cursor"
+    else:
+        cursor = None
+
+    return limit, cursor, None
+
+
+def get_sort_param(sorts, default):
+    """
+    Read the sort param from the query string: a name of sorts for ascending order, '-name' for descending.
+    Returns (name, descending, error).
+    """
+    sort = request.args.get('sort', default)
+    descending = sort.startswith('-')
+    name = sort[1:] if descending else sort
+    if name not in sorts:
+        return None, False, f"sort must be one of: {', '.join(sorts)} (prefix with - for descending)"
+    return name, descending, None
+
+
+def keyset_order(stmt, id_column, sort_column=None, descending=False):
+    """Order a select by (sort_column, id_column) the way keyset_paginate pages it, NULL sort values last."""
+    order = desc if descending else asc
+    if sort_column is None:
+        return stmt.order_by(order(id_column))
+    return stmt.order_by(order(sort_column).nulls_last(), order(id_column))
+
+
+def keyset_paginate(stmt, id_column, limit, cursor, sort_column=None, descending=False):
+    """
+    Apply keyset pagination ordered by (sort_column, id_column) to a select statement.
+    NULL sort values are kept at the end of the listing in both directions.
+    One extra row is fetched so paginate_rows can tell whether there is a next page.
+    """
+    after = operator.lt if descending else operator.gt
+
+    if sort_column is None:
+        if cursor is not None:
+            stmt = stmt.where(after(id_column, cursor[1]))
+        return keyset_order(stmt, id_column, descending=descending).limit(limit + 1)
+
+    if cursor is not None:
+        sort_value, row_id = cursor
+        if sort_value is None:
+            stmt = stmt.where(sort_column.is_(None), after(id_column, row_id))
+        else:
+            stmt = stmt.where(or_(
+                after(sort_column, sort_value),
+                and_(sort_column == sort_value, after(id_column, row_id)),
+                sort_column.is_(None),
+            ))
+    return keyset_order(stmt, id_column, sort_column, descending).limit(limit + 1)
+
+
+def paginate_rows(rows, limit, sort_key=None):
+    """
+    Trim the extra row fetched by keyset_paginate and build the next cursor.
+    sort_key extracts the sort value from a row; returns (rows, next_cursor).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort_key(last) if sort_key else None, last.id)
+
+
+def fetch_page(stmt, id_column, limit, cursor, sort_column=None, descending=False):
+    """Run a keyset-paginated select of column rows, returns (rows, next_cursor)."""
+    rows = db.session.execute(
+        keyset_paginate(stmt, id_column, limit, cursor, sort_column, descending)
+    ).all()
+    sort_key = (lambda row: row._mapping[sort_column]) if sort_column is not None else None
+    return paginate_rows(rows, limit, sort_key)
@@ -1,7 +1,10 @@
 from flask import request, jsonify
 from .. import api_bp
 from models import Slider, db, User
-from .shared_functions import process_image, delete_image
+from .images import process_image, schedule_upload, delete_image
+from .storage import image_variants
+from cache import cached_catalog
+from decorator import conditional_get
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 SLIDER_UPLOAD_FOLDER = 'sliders'  
@@ -16,10 +19,10 @@ def create_slider():
     if not title or not description:
         return jsonify({"status": False, "message": "Title and description are required"}), 400
 
-    image_path = None
+    image_upload = None
     if 'image' in request.files:
         file = request.files['image']
-        image_path, error = process_image(file, SLIDER_UPLOAD_FOLDER) 
+        image_upload, error = process_image(file, SLIDER_UPLOAD_FOLDER) 
         
         if error:
             return jsonify({"message": error, "status": False}), 400 
@@ -27,26 +30,28 @@ def create_slider():
         return jsonify({"status": False, "message": "Image is required"}), 400
     
 
-    slider = Slider(image_path=image_path, title=title, description=description)
+    slider = Slider(title=title, description=description)
     db.session.add(slider)
+    schedule_upload(image_upload, slider)  # Uploaded in the background once committed
     db.session.commit()
 
     return jsonify({
         "status": True,
-        "message": "Slider created successfully"
+        "message": "Slider created successfully",
+        "image_status": "pending"
     }), 201
 
 
 @api_bp.route('/sliders', methods=['GET'])
+@conditional_get(user=False)
 def get_all_sliders():
-    sliders = Slider.query.all()
-    
-    slider_list = list(map(lambda slider: {
+    slider_list = cached_catalog(('sliders',), lambda: list(map(lambda slider: {
         "id": slider.id,
         "title": slider.title,
         "description": slider.description,
-        "image_path": slider.image_path
-    }, sliders))
+        "image_path": slider.image_path,
+        "images": image_variants(slider.image_path)
+    }, Slider.query.all())))
 
     response = {
         "status": True,
@@ -57,6 +62,7 @@ def get_all_sliders():
 
 
 @api_bp.route('/slider/<int:id>', methods=['GET'])
+@conditional_get(user=False)
 def get_slider(id):
     
     if not id:
@@ -71,7 +77,19 @@ def get_slider(id):
         return {"message": "id must be an integer", "status": False}, 400
 
     
-    slider = Slider.query.get(id)
+    def build():
+        slider = Slider.query.get(id)
+        if not slider:
+            return None
+        return {
+            "id": slider.id,
+            "title": slider.title,
+            "description": slider.description,
+            "image_path": slider.image_path,
+            "images": image_variants(slider.image_path),
+        }
+
+    slider = cached_catalog(('slider', id), build)
     if not slider:
         return {
             "message": "Slider not found",
@@ -80,12 +98,7 @@ def get_slider(id):
     
     response = {
         "status": True,
-        "slider": {
-            "id": slider.id,
-            "title": slider.title,
-            "description": slider.description,
-            "image_path": slider.image_path,
-        },
+        "slider": slider,
     }
     return jsonify(response), 200
 
@@ -116,20 +129,24 @@ def update_slider(id):
         slider.description = description
 
     if image:
-        image_path, error = process_image(image, SLIDER_UPLOAD_FOLDER, slider.image_path) 
+        image_upload, error = process_image(image, SLIDER_UPLOAD_FOLDER) 
         if error:
             return jsonify({"message": error, "status": False}), 400 
         
-        slider.image_path = image_path
+        schedule_upload(image_upload, slider)
 
     db.session.commit()
 
-    return jsonify({"status": True, "message": "Slider updated successfully", "slider": {
+    response = {"status": True, "message": "Slider updated successfully", "slider": {
         "id": slider.id,
         "title": slider.title,
         "description": slider.description,
-        "image_path": slider.image_path
-    }}), 200
+        "image_path": slider.image_path,
+        "images": image_variants(slider.image_path)
+    }}
+    if image:
+        response["image_status"] = "pending"  # image_path still holds the previous image
+    return jsonify(response), 200
 
 
 @api_bp.route('/slider/<int:id>', methods=['DELETE'])
@@ -149,9 +166,7 @@ def delete_slider(id):
         return jsonify({"status": False, "message": "Slider not found"}), 404
 
     if slider.image_path:
-        error = delete_image(slider.image_path)
-        if error:
-            return jsonify({"message": error, "status": False}), 500
+        delete_image(slider.image_path)  # Queued, removed from Cloudinary after commit
 
     # Delete the slider from the database
     db.session.delete(slider)
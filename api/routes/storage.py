@@ -0,0 +1,233 @@
+import os
+import uuid
+import shutil
+import hashlib
+import logging
+
+import cloudinary
+import cloudinary.api
+import cloudinary.utils
+import cloudinary.uploader
+from cloudinary.exceptions import NotFound
+from flask import current_app
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is only needed to build variants on the local backend
+    Image = None
+
+# Image storage backends.
+# Files are addressed by the SHA-256 of their content under a folder, so storing
+# an image that is already there is a no-op that returns the existing URL.
+# The backend is picked with IMAGE_STORAGE ('cloudinary' or 'local').
+#
+# Each stored raster image also gets resized WebP variants, listed in IMAGE_VARIANTS
+# with their maximum width. Serializers expose them through image_variants().
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+IMAGE_VARIANTS = {
+    'thumbnail': 200,
+    'card': 600,
+    'full': 1600,
+}
+VARIANT_QUALITY = 80
+
+
+def hash_stream(stream, destination_path, head=b''):
+    """
+    Copy a stream to destination_path in chunks, returns the hex SHA-256 of its content.
+    head holds bytes already read from the stream.
+    """
+    digest = hashlib.sha256(head)
+    with open(destination_path, 'wb') as destination:
+        destination.write(head)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            destination.write(chunk)
+    return digest.hexdigest()
+
+
+class ImageStorage:
+    """Interface of an image storage backend."""
+
+    def save(self, source_path, folder, content_hash, ext):
+        """Store the file at source_path as folder/content_hash and return its public URL."""
+        raise NotImplementedError
+
+    def key_from_url(self, image_url):
+        """Return the backend key of a URL returned by save."""
+        raise NotImplementedError
+
+    def variant_urls(self, image_url):
+        """Return {variant name: URL} for an image, falling back to the original when a variant is missing."""
+        return {name: image_url for name in IMAGE_VARIANTS}
+
+    def delete_many(self, keys):
+        """Delete the given keys, returns the set of keys that are gone (deleted or not found)."""
+        raise NotImplementedError
+
+
+class CloudinaryStorage(ImageStorage):
+
+    def __init__(self, config):
+        cloudinary.config(
+            cloud_name=config['CLOUDINARY_CLOUD_NAME'],
+            api_key=config['CLOUDINARY_API_KEY'],
+            api_secret=config['CLOUDINARY_API_SECRET'],
+            secure=True
+        )
+        self.timeout = config['IMAGE_UPLOAD_TIMEOUT']
+        self.chunk_size = config['IMAGE_UPLOAD_CHUNK_SIZE']
+        self.transformations = {
+            name: {"crop": "limit", "width": width, "quality": "auto", "fetch_format": "webp"}
+            for name, width in IMAGE_VARIANTS.items()
+        }
+
+    def save(self, source_path, folder, content_hash, ext):
+        public_id = f"{folder}/{content_hash}"
+        try:
+            # Identical content was uploaded before, reuse it
+            return cloudinary.api.resource(public_id, timeout=self.timeout)["secure_url"]
+        except NotFound:
+            pass
+        except Exception as e:
+            # The lookup goes through the rate-limited Admin API, a failed one only costs the dedup:
+            # overwrite=False below keeps an existing resource as it is
+            logger.warning("Looking up %s failed, uploading it: %s", public_id, e)
+        # upload_large sends the file in chunks instead of building the whole request in memory
+        # The variants are generated eagerly, so the first client to ask for one doesn't wait on it
+        result = cloudinary.uploader.upload_large(
+            source_path, public_id=content_hash, folder=folder, overwrite=False, chunk_size=self.chunk_size,
+            timeout=self.timeout, eager=list(self.transformations.values()), eager_async=True
+        )
+        return result.get("secure_url")
+
+    def key_from_url(self, image_url):
+        # Extract the public ID (folder/name without extension) from the URL
+        url_parts = image_url.split('/')
+        folder_name = url_parts[-2]
+        file_name = url_parts[-1].split('.')[0]
+        return f"{folder_name}/{file_name}"
+
+    def variant_urls(self, image_url):
+        if '/upload/' not in image_url:
+            return super().variant_urls(image_url)
+        # Variants are the same resource delivered with a transformation in the URL
+        prefix, path = image_url.split('/upload/', 1)
+        return {
+            name: f"{prefix}/upload/{cloudinary.utils.generate_transformation_string(**dict(options))[0]}/{path}"
+            for name, options in self.transformations.items()
+        }
+
+    def delete_many(self, keys):
+        result = cloudinary.api.delete_resources(list(keys), timeout=self.timeout)
+        return {key for key, status in result.get("deleted", {}).items() if status in ("deleted", "not_found")}
+
+
+class LocalStorage(ImageStorage):
+
+    def __init__(self, config):
+        self.root = config['LOCAL_STORAGE_DIR']
+        self.base_url = config['LOCAL_STORAGE_URL'].rstrip('/')
+
+    def path_for(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Invalid image key: {key}")
+        return path
+
+    def save(self, source_path, folder, content_hash, ext):
+        key = f"{folder}/{content_hash}.{ext}"
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Stream into a temporary name, then publish atomically
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(source_path, 'rb') as source, open(tmp_path, 'wb') as destination:
+                shutil.copyfileobj(source, destination, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        self.save_variants(path)
+        return f"{self.base_url}/{key}"
+
+    @staticmethod
+    def variant_key(key, name):
+        return f"{key.rsplit('.', 1)[0]}_{name}.webp"
+
+    def save_variants(self, path):
+        """Write the resized WebP variants next to the original, skipping the ones already there."""
+        if Image is None:
+            return
+        try:
+            with Image.open(path) as original:
+                image = ImageOps.exif_transpose(original)
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA')
+                for name, width in IMAGE_VARIANTS.items():
+                    variant_path = self.variant_key(path, name)
+                    if os.path.exists(variant_path):
+                        continue
+                    variant = image.copy()
+                    variant.thumbnail((width, variant.height))  # Only ever shrinks, keeps the aspect ratio
+                    tmp_path = f"{variant_path}.{uuid.uuid4().hex}.tmp"
+                    variant.save(tmp_path, 'WEBP', quality=VARIANT_QUALITY)
+                    os.replace(tmp_path, variant_path)
+        except Exception as e:
+            # Clients fall back to the original image
+            logger.warning("Could not build variants of %s: %s", path, e)
+
+    def key_from_url(self, image_url):
+        if image_url.startswith(self.base_url + '/'):
+            return image_url[len(self.base_url) + 1:]
+        return '/'.join(image_url.split('/')[-2:])
+
+    def variant_urls(self, image_url):
+        urls = {}
+        for name in IMAGE_VARIANTS:
+            variant_key = self.variant_key(self.key_from_url(image_url), name)
+            try:
+                exists = os.path.exists(self.path_for(variant_key))
+            except ValueError:
+                exists = False
+            urls[name] = f"{self.base_url}/{variant_key}" if exists else image_url
+        return urls
+
+    def delete_many(self, keys):
+        gone = set()
+        for key in keys:
+            for variant_key in [key, *(self.variant_key(key, name) for name in IMAGE_VARIANTS)]:
+                try:
+                    os.remove(self.path_for(variant_key))
+                except (FileNotFoundError, ValueError):
+                    pass  # Already gone, or a key that can't live under the storage root
+            gone.add(key)
+        return gone
+
+
+STORAGE_BACKENDS = {
+    'cloudinary': CloudinaryStorage,
+    'local': LocalStorage,
+}
+
+
+def get_storage(app=None):
+    """Return the app's configured storage backend, created on first use."""
+    app = app or current_app
+    if 'image_storage' not in app.extensions:
+        backend = app.config['IMAGE_STORAGE']
+        if backend not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown IMAGE_STORAGE backend: {backend}")
+        app.extensions['image_storage'] = STORAGE_BACKENDS[backend](app.config)
+    return app.extensions['image_storage']
+
+
+def image_variants(image_url):
+    """Serialize the variants of an image for API responses, None when there is no image."""
+    if not image_url:
+        return None
+    return get_storage().variant_urls(image_url)
@@ -1,14 +1,66 @@
 # api/routes/auth.py
 from flask import request, jsonify
-from models import User, db
+from models import User, Product, db, favorites, begin_write
 from .. import api_bp
-from flask_jwt_extended import create_refresh_token, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
-from .shared_functions import process_image, delete_image
+from decorator import conditional_get, deferred_writes
+from flask_jwt_extended import create_refresh_token, create_access_token, jwt_required, get_jwt_identity, get_jwt, current_user
+from .images import process_image, schedule_upload, delete_image
+from .storage import image_variants
+from .fieldsets import get_fieldset, project
+from revocation import VERSION_CLAIM, token_claims, revoke_tokens
+from passwords import hash_password, verify_password, needs_rehash
+from identity import reload_user
 
 USER_UPLOAD_FOLDER = 'users'  
 
+# Serialized favorite product field -> the column it is read from
+FAVORITE_FIELDS = {
+    "id": Product.id,
+    "name": Product.name,
+    "description": Product.description,
+    "price": Product.price,
+    "image_path": Product.image_path,
+    "images": Product.image_path,
+    "rating": Product.rating,
+    "best_seller": Product.best_seller,
+}
+
+
+def favorite_products(user_id, fields=None):
+    """Return a user's favorite products, selecting only the columns of the given fields (all when None)."""
+    names = [name for name in FAVORITE_FIELDS if fields is None or name in fields]
+    columns = {FAVORITE_FIELDS[name].key: FAVORITE_FIELDS[name] for name in names} or {"id": Product.id}
+    rows = db.session.execute(
+        db.select(*columns.values())
+        .join(favorites, favorites.c.product_id == Product.id)
+        .where(favorites.c.user_id == user_id)
+    )
+    return [
+        {name: image_variants(row.image_path) if name == "images" else getattr(row, FAVORITE_FIELDS[name].key)
+         for name in names}
+        for row in rows
+    ]
+
+
+def format_user(user, fieldset=None):
+    """Serialize a user for login and get_user_data, favorites are only queried when included."""
+    user_data = {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "phone": user.phone,
+        "image_path": user.image_path,
+        "images": image_variants(user.image_path),
+    }
+    if fieldset is None:
+        user_data["favorite_products"] = favorite_products(user.id)
+    elif fieldset.wants('favorites'):
+        user_data["favorite_products"] = favorite_products(user.id, fieldset.includes['favorites'])
+    return project(fieldset, user_data)
+
+
 @api_bp.route('/login', methods=['POST'])
+@deferred_writes
 def login():
     
     email = request.form.get('email', '').strip()
@@ -18,36 +70,33 @@ def login():
     if not email or not password:
         return jsonify({"status": False, "message": "Username and password are required"}), 400
 
+    fieldset, error = get_fieldset('user')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
+
 
     user = User.query.filter_by(email=email).first()
     if not user: 
         return jsonify({"status": False, "message": "Wrong email"}), 401
-    elif not check_password_hash(user.password, password):
+    elif not verify_password(user.password, password):
         return jsonify({"status": False, "message": "Wrong password"}), 401
+    elif user.blocked:
+        return jsonify({"status": False, "message": "Your account is blocked. You cannot perform any actions."}), 403
 
-    access_token = create_access_token(identity=user.id)
-    refresh_token = create_refresh_token(identity=user.id)
+    if needs_rehash(user.password):
+        # Hashed with older parameters, the plain password is only at hand now
+        password_hash = hash_password(password)
+        db.session.commit()  # Ends the read transaction, the write one takes the lock
+        begin_write()
+        user.password = password_hash
+        user.pass_hidden = password_hash
+        db.session.commit()
 
-    user_data = {
-        "id": user.id,
-        "name": user.name,
-        "email": user.email,
-        "phone": user.phone,
-        "image_path": user.image_path,
-        "favorite_products": [
-            {
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "price": product.price,
-                "image_path": product.image_path,
-                "rating": product.rating,
-                "best_seller": product.best_seller,
-            } for product in user.favorite_products
-        ]
-    }
+    access_token = create_access_token(identity=user.id, additional_claims=token_claims(user))
+    refresh_token = create_refresh_token(identity=user.id, additional_claims=token_claims(user))
+
+    user_data = format_user(user, fieldset)
 
-    
     return jsonify({"status": True, 
                     "access_token": access_token,
                     "refresh_token": refresh_token,
@@ -57,6 +106,7 @@ def login():
 
 
 @api_bp.route('/register', methods=['POST'])
+@deferred_writes
 def create_user():
     name = request.form.get('name')
     email = request.form.get('email')
@@ -80,42 +130,42 @@ def create_user():
         return jsonify({"status": False,
                          "message": "Password must be at least 6 characters long"
                          }), 400
-    image_path = None
+    image_upload = None
     if 'image' in request.files:
         file = request.files['image']
-        image_path, error = process_image(file, USER_UPLOAD_FOLDER) 
+        image_upload, error = process_image(file, USER_UPLOAD_FOLDER) 
         
         if error:
             return jsonify({"message": error, "status": False}), 400 
     
     # Create a new user with the provided permissions
-    new_user = User(name=name, email=email, phone=phone, pass_hidden=generate_password_hash(password), password=generate_password_hash(password), image_path=image_path)
+    password_hash = hash_password(password)
+    db.session.commit()  # Ends the read transaction, the write one takes the lock
+    begin_write()
+    new_user = User(name=name, email=email, phone=phone, pass_hidden=password_hash, password=password_hash)
     db.session.add(new_user)
+    if image_upload:
+        schedule_upload(image_upload, new_user)  # Uploaded in the background once committed
     db.session.commit()
 
-    return jsonify({"status": True, 
-                    "message": "User Registered successfully"
-                    }), 201
+    response = {"status": True, 
+                "message": "User Registered successfully"
+                }
+    if image_upload:
+        response["image_status"] = "pending"
+    return jsonify(response), 201
 
 
 
 @api_bp.route('/delete_user', methods=['DELETE'])
 @jwt_required()
 def delete_user():
-    current_user_id = get_jwt_identity()
-    try:
-        current_user_id = int(current_user_id)
-    except ValueError:
-        return jsonify({"message": "id must be an integer", "status": False}), 400
-
-    user = User.query.get(current_user_id)
-    if not user:
-        return jsonify({"status": False, "message": "User not found"}), 404
+    user = current_user
 
     if user.image_path:
-        error = delete_image(user.image_path)
-        if error:
-            return jsonify({"message": error, "status": False}), 500
+        delete_image(user.image_path)  # Queued, removed from Cloudinary after commit
+
+    revoke_tokens(user)  # Every worker rejects the user's tokens, whatever it has cached
 
     # Delete the slider from the database
     db.session.delete(user)
@@ -127,16 +177,11 @@ def delete_user():
 @api_bp.route('/update_profile', methods=['PUT'])
 @jwt_required() 
 def edit_user():
-    current_user_id = get_jwt_identity()
-
     name = request.form.get('name')
     phone = request.form.get('phone')
     image = request.files.get('image') 
     
-    # Fetch the user whose permissions are to be updated
-    user_to_update = User.query.get(current_user_id)
-    if not user_to_update:
-        return jsonify({"status": False, "message": "User to update not found"}), 404
+    user_to_update = current_user
 
     # If neither username nor permissions are provided, return an error
     if not name and not image and not phone:
@@ -155,11 +200,11 @@ def edit_user():
             return jsonify({"status": False, "message": "Phone number is Invalid"}), 400
     
     if image:
-        image_path, error = process_image(image, USER_UPLOAD_FOLDER, user_to_update.image_path) 
+        image_upload, error = process_image(image, USER_UPLOAD_FOLDER) 
         if error:
             return jsonify({"message": error, "status": False}), 400 
         
-        user_to_update.image_path = image_path
+        schedule_upload(image_upload, user_to_update)
 
     user_to_update.name = name
     user_to_update.phone = phone
@@ -167,62 +212,44 @@ def edit_user():
     # Commit the changes to the database
     db.session.commit()
 
-    return jsonify({
+    response = {
         "status": True,
         "message": "User information updated successfully"
-    }), 200
+    }
+    if image:
+        response["image_status"] = "pending"
+    return jsonify(response), 200
 
 
 @api_bp.route('/get_user_data', methods=['GET'])
 @jwt_required()
+@conditional_get()
 def get_user_data():
-    user_id = get_jwt_identity() 
+    fieldset, error = get_fieldset('user')
+    if error:
+        return jsonify({"status": False, "message": error}), 400
 
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"status": False, "message": "User not found"}), 404
-    
-    user_data = {
-        "id": user.id,
-        "name": user.name,
-        "email": user.email,
-        "phone": user.phone,
-        "image_path": user.image_path,
-        "favorite_products": [
-            {
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "price": product.price,
-                "image_path": product.image_path,
-                "rating": product.rating,
-                "best_seller": product.best_seller,
-            } for product in user.favorite_products
-        ]
-    }
-    
     return jsonify({
         "status": True,
-        "user": user_data 
+        "user": format_user(current_user, fieldset)
     }), 200
 
 
 @api_bp.route('/refresh_token', methods=['POST'])
 @jwt_required(refresh=True)
 def refresh():
-    current_user = get_jwt_identity()
-    new_access_token = create_access_token(identity=current_user)
+    # The refresh token passed the revocation check, so its version is current
+    new_access_token = create_access_token(identity=get_jwt_identity(),
+                                           additional_claims={VERSION_CLAIM: get_jwt().get(VERSION_CLAIM, 0)})
     return jsonify({ 
         "status": True, 
         "access_token": new_access_token,
     }), 200
 
 @api_bp.route('/change_password', methods=['POST'])
+@deferred_writes
 @jwt_required()
 def change_password():
-    # Get the user ID from the token
-    user_id = get_jwt_identity()
     current_password = request.form.get('current_password')
     new_password = request.form.get('new_password')
     new_password_confirm = request.form.get('new_password_confirm')
@@ -243,22 +270,30 @@ def change_password():
                         "message": "New password and new password confirmation do not match"
                         }), 400
 
-    # Fetch the user
-    user = User.query.get(user_id)
-    if not user:
+    user = reload_user(current_user.id)  # The cached copy may predate a change made through another worker
+    if user is None:
         return jsonify({"status": False, "message": "User not found"}), 404
 
     # Verify current password
-    if not check_password_hash(user.password, current_password):
+    if not verify_password(user.password, current_password):
         return jsonify({"status": False, "message": "Current password is incorrect"}), 400
 
 
     # Hash and update the new password
-    user.password = generate_password_hash(new_password)
-    user.pass_hidden = new_password
+    password_hash = hash_password(new_password)
+    db.session.commit()  # Ends the read transaction, the write one takes the lock
+    begin_write()
+    user.password = password_hash
+    user.pass_hidden = password_hash
+    revoke_tokens(user)  # Logs out every other session
     db.session.commit()
 
-    return jsonify({"status": True, "message": "Password changed successfully"}), 200
+    return jsonify({
+        "status": True,
+        "message": "Password changed successfully",
+        "access_token": create_access_token(identity=user.id, additional_claims=token_claims(user)),
+        "refresh_token": create_refresh_token(identity=user.id, additional_claims=token_claims(user)),
+    }), 200
 
 
 
@@ -1,7 +1,13 @@
+import sys
+import click
 from flask import Flask, jsonify
 from api import api_bp
 from config import Config
-from models import db  
+from models import db, configure_sqlite, begin_write
+from sql_trace import init_sql_tracing
+from metrics import init_metrics
+from identity import load_user
+from revocation import is_token_revoked, is_blocked
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
@@ -24,6 +30,30 @@ def custom_expired_token_callback(jwt_header, jwt_payload):
     }), 401
 
 
+@jwt.user_lookup_loader
+def user_lookup_callback(jwt_header, jwt_payload):
+    # Runs once per authenticated request, views read the user from current_user
+    return load_user(jwt_payload[app.config['JWT_IDENTITY_CLAIM']])
+
+
+@jwt.user_lookup_error_loader
+def custom_user_lookup_error_callback(jwt_header, jwt_payload):
+    return jsonify({"status": False, "message": "User not found"}), 404
+
+
+@jwt.token_in_blocklist_loader
+def token_in_blocklist_callback(jwt_header, jwt_payload):
+    # Checked against the in-memory denylist, no query
+    return is_token_revoked(jwt_payload)
+
+
+@jwt.revoked_token_loader
+def custom_revoked_token_callback(jwt_header, jwt_payload):
+    if is_blocked(jwt_payload[app.config['JWT_IDENTITY_CLAIM']]):
+        return jsonify({"status": False, "message": "Your account is blocked. You cannot perform any actions."}), 403
+    return jsonify({"status": False, "message": "Token has been revoked. Please log in again."}), 401
+
+
 @jwt.invalid_token_loader
 def custom_invalid_token_callback(error):
     # Custom error message for when only refresh tokens are allowed
@@ -33,12 +63,94 @@ def custom_invalid_token_callback(error):
     }), 422
 
 
+@app.errorhandler(413)
+def request_entity_too_large(error):
+    max_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({
+        "status": False,
+        "message": f"File is too large. The maximum upload size is {max_mb} MB."
+    }), 413
+
+
 db.init_app(app)
+with app.app_context():
+    configure_sqlite(db.engine, app.config)
+init_sql_tracing(app)
 migrate = Migrate(app, db)
 
 app.register_blueprint(api_bp, url_prefix='/api')
+init_metrics(app)
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the product full-text search index."""
+    from search import rebuild_search_index
+    begin_write()
+    rebuild_search_index()
+
+
+@app.cli.command('resume-image-uploads')
+def resume_image_uploads_command():
+    """Requeue image uploads left pending or stuck by a restarted worker."""
+    from api.routes.images import resume_pending_uploads
+    print(f"Requeued {resume_pending_uploads(app)} image uploads")
+
+
+@app.cli.command('drain-image-deletions')
+def drain_image_deletions_command():
+    """Delete every queued remote image that is due, in batches."""
+    from api.routes.images import drain_image_deletions
+    total = batch = drain_image_deletions(app)
+    while batch == app.config['IMAGE_DELETE_BATCH_SIZE']:
+        batch = drain_image_deletions(app)
+        total += batch
+    print(f"Processed {total} queued image deletions")
+
+
+def _set_user_blocked(email, blocked):
+    from models import User
+    from revocation import set_blocked
+    begin_write()
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        print(f"No user with the email {email}")
+        sys.exit(1)
+    set_blocked(user, blocked)
+    db.session.commit()
+
+
+@app.cli.command('block-user')
+@click.argument('email')
+def block_user_command(email):
+    """Block a user and revoke their tokens, every worker rejects them within seconds."""
+    _set_user_blocked(email, True)
+    print(f"Blocked {email}")
+
+
+@app.cli.command('unblock-user')
+@click.argument('email')
+def unblock_user_command(email):
+    """Unblock a user, they have to log in again."""
+    _set_user_blocked(email, False)
+    print(f"Unblocked {email}")
+
+
+@app.cli.command('check-query-plans')
+@click.option('--seed', 'n_products', default=20000, show_default=True, help='Products to seed (rolled back).')
+@click.option('--verbose', is_flag=True, help='Print every plan, not only the failing ones.')
+def check_query_plans_command(n_products, verbose):
+    """EXPLAIN the main endpoint queries on a seeded dataset and fail on sequential scans."""
+    from query_plans import check_query_plans
+    begin_write()  # The seeded rows are written, then rolled back
+    failures = check_query_plans(n_products, verbose)
+    if failures:
+        print(f"{len(failures)} queries use a sequential scan")
+        sys.exit(1)
+    print("No sequential scans")
+
 
 if __name__ == '__main__':
     app.run()
 #host='0.0.0.0', port=5000
-# gunicorn -w 4 -b 0.0.0.0:5000 app:app
+# gunicorn -w 4 -b 0.0.0.0:5000 app:app
\ No newline at end of file
@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmarks.run import ROOT, percentile
+
+# Write throughput under concurrent workers.
+# Seeds a fresh SQLite database, serves the app with gunicorn and has concurrent
+# clients place orders and add favorites over HTTP for a fixed time, then reports
+# successful writes per second, latency and every failed request by status.
+# Run it with and without the SQLite production profile to compare:
+#
+#   python -m benchmarks.concurrency --workers 4 --clients 16 --duration 10
+#   python -m benchmarks.concurrency --workers 4 --clients 16 --duration 10 --no-sqlite-tuning
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Measure write throughput of gunicorn workers on SQLite.')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent clients, each with its own user')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load')
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--order-lines', type=int, default=3)
+    parser.add_argument('--favorite-share', type=float, default=0.3, help='Share of writes that add a favorite')
+    parser.add_argument('--no-sqlite-tuning', action='store_true', help='Run without the SQLite production profile')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed of the generated data and the load')
+    return parser.parse_args()
+
+
+def configure_environment(args, workdir):
+    # Read by this process when app.py is imported and inherited by the gunicorn workers
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'concurrency.db')}"
+    os.environ['UPLOAD_SPOOL_DIR'] = os.path.join(workdir, 'spool')
+    os.environ['SQLITE_TUNING'] = '0' if args.no_sqlite_tuning else '1'
+    os.environ['SQL_TRACE'] = '0'
+    os.environ['METRICS_ENABLED'] = '0'
+    os.environ.pop('FLASK_DEBUG', None)
+    sys.path.insert(0, ROOT)
+
+
+def seed_database(args):
+    """Migrate and seed the database, returns (access token, product ids) per client."""
+    from flask_migrate import upgrade
+    from flask_jwt_extended import create_access_token
+    from app import app
+    from models import db, User
+    from revocation import token_claims
+    from seed_data import seed
+
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        seeded = seed(args.clients, max(args.products // 100, 1), args.products,
+                      favorites_per_user=0, orders_per_user=0, rng_seed=args.seed)
+        db.session.commit()
+        tokens = [create_access_token(identity=user_id, additional_claims=token_claims(db.session.get(User, user_id)))
+                  for user_id in seeded["users"]]
+        product_ids = list(seeded["products"])
+        db.session.remove()
+        db.engine.dispose()  # Leave the database to the workers
+    return tokens, product_ids
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, port):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', '--log-level', 'warning',
+         'app:app'],
+        cwd=ROOT,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/sliders', timeout=1).close()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("gunicorn did not start")
+
+
+def post(url, token, data=None, json_body=None):
+    headers = {'Authorization': f'Bearer {token}'}
+    if json_body is not None:
+        body = json.dumps(json_body).encode()
+        headers['Content-Type'] = 'application/json'
+    else:
+        body = urllib.parse.urlencode(data).encode()
+    request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 'connection error'
+
+
+def run_client(base_url, index, token, product_ids, args, stop_at, results):
+    rng = random.Random(args.seed + index)
+    # Every client favorites its own products, so no add is refused as a duplicate
+    favorites = iter(product_ids[index::args.clients])
+    latencies, statuses = [], {}
+    while time.monotonic() < stop_at:
+        started = time.perf_counter()
+        if rng.random() < args.favorite_share:
+            status = post(f'{base_url}/api/add_to_favorite', token, data={'product_id': next(favorites)})
+        else:
+            items = [{'product_id': rng.choice(product_ids), 'quantity': 1} for _ in range(args.order_lines)]
+            status = post(f'{base_url}/api/place_order', token, json_body={'items': items})
+        latencies.append(time.perf_counter() - started)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    results[index] = (latencies, statuses)
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='concurrency-')
+    configure_environment(args, workdir)
+    tokens, product_ids = seed_database(args)
+
+    port = free_port()
+    server = start_server(args.workers, port)
+    try:
+        results = {}
+        stop_at = time.monotonic() + args.duration
+        clients = [
+            threading.Thread(target=run_client,
+                             args=(f'http://127.0.0.1:{port}', i, token, product_ids, args, stop_at, results))
+            for i, token in enumerate(tokens)
+        ]
+        started = time.monotonic()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(latency for client_latencies, _ in results.values() for latency in client_latencies)
+    statuses = {}
+    for _, client_statuses in results.values():
+        for status, count in client_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    writes = sum(count for status, count in statuses.items() if status.startswith('2'))
+    print(f"SQLite profile {'off' if args.no_sqlite_tuning else 'on'}, {args.workers} workers, "
+          f"{args.clients} clients, {elapsed:.1f} s")
+    print(f"{writes / elapsed:.1f} writes/s  "
+          f"p50 {percentile(latencies, 50) * 1000:.1f} ms  "
+          f"p95 {percentile(latencies, 95) * 1000:.1f} ms  statuses {statuses}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+
+# Endpoint benchmark suite.
+# Seeds a fresh database through the migrations with deterministic data, drives
+# every API endpoint through Flask's test client and records p50/p95/p99 latency,
+# queries per request and peak Python memory per endpoint as JSON. Images go to
+# an in-process stub storage backend, so no network is involved.
+#
+#   python -m benchmarks.run --users 500 --products 5000
+#   python -m benchmarks.run --database-url postgresql://bench@localhost/bench  (a dedicated, empty database)
+#   python -m benchmarks.run --compare benchmarks/results/<baseline>.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark every API endpoint on seeded data.')
+    parser.add_argument('--database-url', help='Database to seed (default: a temporary SQLite file)')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--favorites-per-user', type=int, default=5)
+    parser.add_argument('--orders-per-user', type=int, default=3)
+    parser.add_argument('--items-per-order', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42, help='Random seed of the generated data')
+    parser.add_argument('--iterations', type=int, default=50, help='Timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint')
+    parser.add_argument('--memory-iterations', type=int, default=5, help='Requests per endpoint traced for memory')
+    parser.add_argument('--only', help='Comma-separated endpoint names to run')
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown before flagging (0.2 = 20%%)')
+    return parser.parse_args()
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile
+    index = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_environment(args, workdir):
+    # Config is read when app.py is imported, so this must run first
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    os.environ['UPLOAD_SPOOL_DIR'] = os.path.join(workdir, 'spool')
+    os.environ['INTERNAL_API_TOKEN'] = 'benchmark'
+    os.environ['SQL_TRACE'] = '0'
+    os.environ['METRICS_ENABLED'] = '0'
+    os.environ.pop('FLASK_DEBUG', None)
+    sys.path.insert(0, ROOT)
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='benchmark-')
+    configure_environment(args, workdir)
+
+    from flask_migrate import upgrade
+    from sqlalchemy import event
+    from flask import has_request_context
+    from app import app
+    from models import db
+    from seed_data import seed
+    from benchmarks.scenarios import StubStorage, build_scenarios
+
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        started = time.perf_counter()
+        seeded = seed(args.users, args.categories, args.products, args.favorites_per_user,
+                      args.orders_per_user, args.items_per_order, rng_seed=args.seed)
+        db.session.commit()
+        seed_seconds = time.perf_counter() - started
+        app.extensions['image_storage'] = StubStorage()
+
+        queries = [0]
+
+        def count_query(*_):
+            if has_request_context():
+                queries[0] += 1
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+
+    client = app.test_client()
+    scenarios = build_scenarios(app, client, seeded)
+    if args.only:
+        wanted = set(args.only.split(','))
+        scenarios = [scenario for scenario in scenarios if scenario.name in wanted]
+
+    results = {}
+    for scenario in scenarios:
+        for i in range(args.warmup):
+            scenario.run(i)
+
+        latencies, query_counts, statuses = [], [], {}
+        for i in range(args.warmup, args.warmup + args.iterations):
+            queries[0] = 0
+            elapsed, status = scenario.run(i)
+            latencies.append(elapsed)
+            query_counts.append(queries[0])
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        tracemalloc.start()
+        peak = 0
+        for i in range(args.warmup + args.iterations, args.warmup + args.iterations + args.memory_iterations):
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            scenario.run(i)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+
+        latencies.sort()
+        results[scenario.name] = {
+            "method": scenario.method,
+            "path": scenario.path,
+            "requests": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            "queries_per_request": round(sum(query_counts) / len(query_counts), 2),
+            "max_queries": max(query_counts),
+            "peak_memory_kb": round(peak / 1024, 1),
+            "statuses": statuses,
+        }
+        row = results[scenario.name]
+        print(f"{scenario.name:<28} p50 {row['p50_ms']:>8.2f} ms  p95 {row['p95_ms']:>8.2f} ms  "
+              f"p99 {row['p99_ms']:>8.2f} ms  {row['queries_per_request']:>6.1f} q/req  "
+              f"{row['peak_memory_kb']:>8.1f} KiB  {statuses}")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "database": app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+            "python": platform.python_version(),
+            "volumes": {
+                "users": args.users, "categories": args.categories, "products": args.products,
+                "favorites_per_user": args.favorites_per_user, "orders_per_user": args.orders_per_user,
+                "items_per_order": args.items_per_order, "seed": args.seed,
+            },
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "results": results,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(baseline, report, args.tolerance):
+            sys.exit(1)
+
+
+def compare(baseline, report, tolerance):
+    """Print the change of every endpoint against a baseline, returns False when something regressed."""
+    if baseline["meta"]["volumes"] != report["meta"]["volumes"]:
+        print("Warning: the baseline was seeded with different volumes")
+    regressions = []
+    for name, row in report["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        change = row["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        slower = change > tolerance
+        more_queries = row["queries_per_request"] > before["queries_per_request"]
+        flag = "REGRESSION" if slower or more_queries else ""
+        print(f"{name:<28} p95 {before['p95_ms']:>8.2f} -> {row['p95_ms']:>8.2f} ms ({change:+.0%})  "
+              f"q/req {before['queries_per_request']:>6.1f} -> {row['queries_per_request']:>6.1f}  {flag}")
+        if flag:
+            regressions.append(name)
+    if regressions:
+        print(f"{len(regressions)} endpoints regressed: {', '.join(regressions)}")
+    return not regressions
+
+
+if __name__ == '__main__':
+    main()
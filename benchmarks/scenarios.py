@@ -0,0 +1,193 @@
+import io
+import time
+import uuid
+
+from flask_jwt_extended import create_access_token, create_refresh_token
+
+from models import db, User, Category, Product, Slider, Order
+from seed_data import SEED_PASSWORD
+from revocation import token_claims
+from api.routes.storage import ImageStorage
+
+# The requests the benchmark sends, one scenario per endpoint.
+# Requests that consume a row (deletes, cancels, new favorites) get a fresh one
+# from an untimed prepare step, so every iteration measures the same work.
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+
+class StubStorage(ImageStorage):
+    """Image storage that keeps nothing, so uploads and deletions cost no I/O."""
+
+    def save(self, source_path, folder, content_hash, ext):
+        return f"https://images.invalid/{folder}/{content_hash}.{ext}"
+
+    def key_from_url(self, image_url):
+        return '/'.join(image_url.split('/')[-2:])
+
+    def delete_many(self, keys):
+        return set(keys)
+
+
+class Scenario:
+
+    def __init__(self, app, client, name, method, path, build):
+        self.app = app
+        self.client = client
+        self.name = name
+        self.method = method
+        self.path = path
+        self.build = build  # i -> (url, test client kwargs), may write untimed setup rows
+
+    def run(self, i):
+        """Send the i-th request, returns (seconds, status code)."""
+        with self.app.app_context():
+            url, kwargs = self.build(i)
+        start = time.perf_counter()
+        response = self.client.open(url, method=self.method, **kwargs)
+        elapsed = time.perf_counter() - start
+        response.close()
+        return elapsed, response.status_code
+
+
+def image(i):
+    return io.BytesIO(PNG_HEADER + f"benchmark image {i}".encode() * 64), 'image.png'
+
+
+def unique(prefix):
+    return f"{prefix} {uuid.uuid4().hex[:12]}"
+
+
+def add(row):
+    db.session.add(row)
+    db.session.commit()
+    return row.id
+
+
+def new_user():
+    return add(User(name=unique('Bench user'), email=f"{uuid.uuid4().hex}@example.com",
+                    phone=uuid.uuid4().hex[:20], password='x', pass_hidden='x'))
+
+
+def build_scenarios(app, client, seeded):
+    """Return the scenarios of every API endpoint against the seeded rows."""
+    with app.app_context():
+        user_id = seeded["users"][0] if seeded["users"] else new_user()
+        password_user_id = seeded["users"][1] if len(seeded["users"]) > 1 else new_user()
+        favorites_user_id = new_user()  # Starts without favorites
+        user_email = db.session.get(User, user_id).email
+        token = create_access_token(identity=user_id)
+        refresh_token = create_refresh_token(identity=user_id)
+        favorites_token = create_access_token(identity=favorites_user_id)
+        category_id = seeded["categories"][0]
+        product_ids = list(seeded["products"]) or [
+            add(Product(name=unique('Bench product'), price=10, rating=4, best_seller=1, category_id=category_id))
+        ]
+        slider_ids = [add(Slider(title=f"Slider {i}", description='Seeded slider', image_path=None)) for i in range(5)]
+        order_id = db.session.execute(
+            db.select(Order.id).where(Order.user_id == user_id).limit(1)
+        ).scalar() or add(Order(user_id=user_id, subtotal=10, tax=0, shipping=0, total=10))
+
+    auth = {'Authorization': f'Bearer {token}'}
+
+    def fixed(url, headers=auth):
+        return lambda i: (url, {'headers': headers})
+
+    def product_form(i):
+        return {'name': unique('Bench product'), 'description': 'Benchmark product', 'price': '19.5',
+                'rating': '4', 'best_seller': '0', 'category_id': str(category_id), 'image': image(i)}
+
+    def order_items(i, lines=3):
+        # Distinct products as long as the catalog has as many as the cart has lines
+        return [{'product_id': product_ids[(i * 7 + k) % len(product_ids)], 'quantity': 1} for k in range(lines)]
+
+    def new_order():
+        return add(Order(user_id=user_id, subtotal=10, tax=0, shipping=0, total=10))
+
+    def deleted_user(i):
+        return '/api/delete_user', {'headers': {'Authorization': f'Bearer {create_access_token(identity=new_user())}'}}
+
+    def changed_password(i):
+        # Alternate between two passwords so every request is a successful change. A change
+        # revokes the user's tokens, so every request gets a token of the current version
+        current, new = (SEED_PASSWORD, 'password2') if i % 2 == 0 else ('password2', SEED_PASSWORD)
+        password_token = create_access_token(identity=password_user_id,
+                                             additional_claims=token_claims(db.session.get(User, password_user_id)))
+        return '/api/change_password', {'headers': {'Authorization': f'Bearer {password_token}'}, 'data': {
+            'current_password': current, 'new_password': new, 'new_password_confirm': new}}
+
+    definitions = [
+        # Reads
+        ('products', 'GET', '/api/products', fixed('/api/products')),
+        ('products_page', 'GET', '/api/products?limit=20', fixed('/api/products?limit=20')),
+        ('products_filtered', 'GET', '/api/products?category_id=&min_price=&sort=-rating&limit=20',
+         fixed(f'/api/products?category_id={category_id}&min_price=100&sort=-rating&limit=20')),
+        ('top_rated_products', 'GET', '/api/top_rated_products', fixed('/api/top_rated_products')),
+        ('top_rated_products_page', 'GET', '/api/top_rated_products?limit=20', fixed('/api/top_rated_products?limit=20')),
+        ('best_seller_products', 'GET', '/api/best_seller_products', fixed('/api/best_seller_products')),
+        ('categories', 'GET', '/api/categories', fixed('/api/categories')),
+        ('categories_page', 'GET', '/api/categories?limit=10', fixed('/api/categories?limit=10')),
+        ('categories_tiles', 'GET', '/api/categories?fields=id,title,images,product_count',
+         fixed('/api/categories?fields=id,title,images,product_count')),
+        ('category_products', 'GET', '/api/category/<id>/products',
+         fixed(f'/api/category/{category_id}/products?sort=-rating')),
+        ('search_products', 'GET', '/api/products/search?q=', fixed('/api/products/search?q=blue box')),
+        ('sliders', 'GET', '/api/sliders', fixed('/api/sliders', headers={})),
+        ('slider', 'GET', '/api/slider/<id>',
+         lambda i: (f'/api/slider/{slider_ids[i % len(slider_ids)]}', {})),
+        ('get_user_data', 'GET', '/api/get_user_data', fixed('/api/get_user_data')),
+        ('orders', 'GET', '/api/orders', fixed('/api/orders')),
+        ('orders_page', 'GET', '/api/orders?limit=10', fixed('/api/orders?limit=10')),
+        ('order', 'GET', '/api/orders/<id>', fixed(f'/api/orders/{order_id}')),
+        ('internal_stats', 'GET', '/api/internal/stats',
+         fixed('/api/internal/stats', headers={'X-Internal-Token': 'benchmark'})),
+        # Auth
+        ('login', 'POST', '/api/login',
+         lambda i: ('/api/login', {'data': {'email': user_email, 'password': SEED_PASSWORD}})),
+        ('refresh_token', 'POST', '/api/refresh_token',
+         fixed('/api/refresh_token', headers={'Authorization': f'Bearer {refresh_token}'})),
+        ('register', 'POST', '/api/register', lambda i: ('/api/register', {'data': {
+            'name': 'Bench user', 'email': f"{uuid.uuid4().hex}@example.com",
+            'phone': uuid.uuid4().hex[:20], 'password': SEED_PASSWORD}})),
+        ('update_profile', 'PUT', '/api/update_profile',
+         lambda i: ('/api/update_profile', {'headers': auth, 'data': {'name': f'Bench user {i}'}})),
+        ('change_password', 'POST', '/api/change_password', changed_password),
+        ('delete_user', 'DELETE', '/api/delete_user', deleted_user),
+        # Catalog writes
+        ('new_product', 'POST', '/api/new_product',
+         lambda i: ('/api/new_product', {'headers': auth, 'data': product_form(i)})),
+        ('update_product', 'PUT', '/api/product/<id>',
+         lambda i: (f'/api/product/{product_ids[i % len(product_ids)]}', {'headers': auth, 'data': {
+             'price': str(10 + i % 50), 'rating': '4', 'best_seller': '0'}})),
+        ('delete_product', 'DELETE', '/api/product/<id>',
+         lambda i: (f"/api/product/{add(Product(name=unique('Bench product'), price=10, category_id=category_id))}",
+                    {'headers': auth})),
+        ('add_to_favorite', 'POST', '/api/add_to_favorite',
+         lambda i: ('/api/add_to_favorite', {'headers': {'Authorization': f'Bearer {favorites_token}'},
+                                             'data': {'product_id': product_ids[i % len(product_ids)]}})),
+        ('new_category', 'POST', '/api/new_category',
+         lambda i: ('/api/new_category', {'headers': auth, 'data': {
+             'title': unique('Bench category'), 'description': 'Benchmark category', 'image': image(i)}})),
+        ('update_category', 'PUT', '/api/category/<id>',
+         lambda i: (f'/api/category/{category_id}', {'headers': auth, 'data': {'description': f'Updated {i}'}})),
+        ('delete_category', 'DELETE', '/api/category/<id>',
+         lambda i: (f"/api/category/{add(Category(title=unique('Bench category')))}", {'headers': auth})),
+        ('new_slider', 'POST', '/api/new_slider',
+         lambda i: ('/api/new_slider', {'headers': auth, 'data': {
+             'title': unique('Bench slider'), 'description': 'Benchmark slider', 'image': image(i)}})),
+        ('update_slider', 'PUT', '/api/slider/<id>',
+         lambda i: (f'/api/slider/{slider_ids[0]}', {'headers': auth, 'data': {'description': f'Updated {i}'}})),
+        ('delete_slider', 'DELETE', '/api/slider/<id>',
+         lambda i: (f"/api/slider/{add(Slider(title=unique('Bench slider')))}", {'headers': auth})),
+        # Orders
+        ('place_order', 'POST', '/api/place_order',
+         lambda i: ('/api/place_order', {'headers': auth, 'json': {'items': order_items(i)}})),
+        *[(f'place_order_{lines}', 'POST', f'/api/place_order ({lines}-line cart)',
+           lambda i, lines=lines: ('/api/place_order', {'headers': auth, 'json': {'items': order_items(i, lines)}}))
+          for lines in (1, 10, 100)],
+        ('cancel_order', 'POST', '/api/orders/cancel/<id>',
+         lambda i: (f'/api/orders/cancel/{new_order()}', {'headers': auth})),
+        ('complete_order', 'POST', '/api/orders/complete/<id>',
+         lambda i: (f'/api/orders/complete/{new_order()}', {'headers': auth})),
+    ]
+    return [Scenario(app, client, *definition) for definition in definitions]
@@ -0,0 +1,137 @@
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import db, CatalogState, Product, Category, Slider
+
+# Catalog response cache.
+# Entries hold the serialized, user-independent part of catalog responses and
+# are keyed by the catalog version, so a write never has to find and evict
+# entries: it bumps the version and stale entries age out of the LRU.
+
+CATALOG_MODELS = (Product, Category, Slider)
+CATALOG_STATE_ID = 1
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A thread-safe, size-bounded LRU mapping with hit/miss counters, entries optionally expire after ttl seconds."""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+catalog_cache = LRUCache(Config.CATALOG_CACHE_SIZE)
+
+
+def get_catalog_state():
+    """Return (version, updated_at) of the catalog, read at most once per request."""
+    if 'catalog_state' not in g:
+        row = db.session.execute(
+            db.select(CatalogState.version, CatalogState.updated_at).where(CatalogState.id == CATALOG_STATE_ID)
+        ).first()
+        g.catalog_state = (row.version, row.updated_at) if row else (0, None)
+    return g.catalog_state
+
+
+def get_catalog_version():
+    return get_catalog_state()[0]
+
+
+def cached_catalog(key, build):
+    """Return the cached value for key at the current catalog version, building it on a miss."""
+    full_key = (get_catalog_version(),) + tuple(key)
+    value = catalog_cache.get(full_key, _MISSING)
+    if value is _MISSING:
+        value = build()
+        catalog_cache.set(full_key, value)
+    return value
+
+
+def with_favorites(products, favorite_ids):
+    """Overlay the per-user is_favorite flag on cached product dicts."""
+    return [{**product, "is_favorite": product["id"] in favorite_ids} for product in products]
+
+
+def _touches_catalog(session):
+    for instance in session.new:
+        if isinstance(instance, CATALOG_MODELS):
+            return True
+    for instance in session.deleted:
+        if isinstance(instance, CATALOG_MODELS):
+            return True
+    for instance in session.dirty:
+        if isinstance(instance, CATALOG_MODELS) and session.is_modified(instance, include_collections=False):
+            return True
+    return False
+
+
+@event.listens_for(Session, 'after_flush')
+def bump_catalog_version(session, flush_context):
+    """Bump the catalog version in the same transaction as any product, category or slider write."""
+    if not _touches_catalog(session):
+        return
+    connection = session.connection()
+    table = CatalogState.__table__
+    now = datetime.now(timezone.utc)
+    result = connection.execute(
+        table.update()
+        .where(table.c.id == CATALOG_STATE_ID)
+        .values(version=table.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(id=CATALOG_STATE_ID, version=1, updated_at=now))
+    if has_app_context():
+        g.pop('catalog_state', None)
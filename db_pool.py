@@ -0,0 +1,82 @@
+import time
+import threading
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+# Connection pool instrumentation.
+# InstrumentedQueuePool is a QueuePool that times every checkout (including the
+# wait for a free connection) and counts checkout timeouts. Counters are kept
+# per pool, so each gunicorn worker reports its own pool.
+
+
+class PoolMetrics:
+    """Thread-safe checkout counters of a pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_total": round(self.wait_total * 1000, 3),
+                "wait_ms_avg": round(self.wait_total * 1000 / attempts, 3) if attempts else 0.0,
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # Keep the counters when the engine rebuilds its pool (e.g. after dispose)
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def stats(self):
+        """Return the current pool occupancy and the checkout counters."""
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "timeout": self._timeout,
+            "in_use": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            **self.metrics.snapshot(),
+        }
+
+
+def pool_stats(engine):
+    """Return the stats of an engine's pool, or None when it isn't instrumented."""
+    pool = engine.pool
+    return pool.stats() if isinstance(pool, InstrumentedQueuePool) else None
@@ -1,18 +1,96 @@
+import hmac
 from functools import wraps
-from flask import jsonify
-from flask_jwt_extended import get_jwt_identity
+from datetime import timezone
+from flask import g, jsonify, request, make_response, current_app
+from flask_jwt_extended import get_jwt_identity, current_user
+from werkzeug.http import is_resource_modified
+
+from models import User, db
+from cache import get_catalog_state
+from revocation import is_blocked
+from identity import refresh_current_user, forget_user
+
+def deferred_writes(func):
+    """
+    Don't take the SQLite write lock when the request's transaction starts: the view hashes a
+    password between reading and writing and calls models.begin_write right before it writes.
+    Goes above jwt_required, whose user lookup opens the request's first transaction.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.deferred_writes = True
+        return func(*args, **kwargs)
+    return wrapper
 
-from models import User
 
 def check_blocked(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
-        
-        # Check if the user is blocked
-        if current_user and current_user.blocked:
+        # Check if the user is blocked, against the denylist rather than the database
+        if is_blocked(get_jwt_identity()):
             return jsonify({"status": False, "message": "Your account is blocked. You cannot perform any actions."}), 403
         
         return func(*args, **kwargs)
     return wrapper
+
+
+def _as_utc(value):
+    # SQLite hands datetimes back naive, they are stored in UTC
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def conditional_get(user=True):
+    """
+    Answer If-None-Match / If-Modified-Since with a 304 before the view runs.
+    The ETag is built from the catalog version (and the user's updated_at when the
+    response depends on the user), never by hashing the response body.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            version, last_modified = get_catalog_state()
+            etag = f"c{version}"
+            last_modified = _as_utc(last_modified)
+
+            if user:
+                user_id = get_jwt_identity()
+                row = db.session.execute(
+                    db.select(User.updated_at).where(User.id == user_id)
+                ).first()
+                if row is None:
+                    # Deleted since this worker cached it
+                    forget_user(current_user.id)
+                    return jsonify({"status": False, "message": "User not found"}), 404
+                refresh_current_user(row.updated_at)  # The body must come from the row the ETag does
+                user_updated_at = _as_utc(row.updated_at)
+                etag += f"-u{user_id}.{int(user_updated_at.timestamp() * 1000000) if user_updated_at else 0}"
+                if user_updated_at and (last_modified is None or user_updated_at > last_modified):
+                    last_modified = user_updated_at
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
+
+
+def internal_only(func):
+    """Only serve callers presenting the INTERNAL_API_TOKEN, the endpoint looks missing to anyone else."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('INTERNAL_API_TOKEN')
+        provided = request.headers.get('X-Internal-Token', '')
+        if not token or not hmac.compare_digest(provided.encode(), token.encode()):
+            return jsonify({"status": False, "message": "Not found"}), 404
+        return func(*args, **kwargs)
+    return wrapper
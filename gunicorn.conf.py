@@ -0,0 +1,10 @@
+import os
+
+# Picked up automatically by gunicorn from the working directory
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of an exited worker from the shared metrics directory (see metrics.py)
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
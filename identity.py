@@ -0,0 +1,98 @@
+from flask_jwt_extended import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from config import Config
+from models import db, User
+from cache import LRUCache
+
+# Users of authenticated requests.
+# flask_jwt_extended calls load_user once per request (app.py registers it as the
+# user lookup) and views read the result from current_user. Users are cached per
+# worker for USER_CACHE_TTL seconds as detached copies that are merged into the
+# request's session without a query. Committing a change to a user evicts it
+# from this worker's cache; other workers serve it until their entry expires,
+# except on conditional GETs, which read users.updated_at anyway and reload a
+# copy that is out of date (refresh_current_user).
+
+user_cache = LRUCache(Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+
+USER_COLUMNS = [attr.key for attr in User.__mapper__.column_attrs]
+
+
+def _detached_copy(user):
+    # A copy that shares nothing with the session, safe to merge from any thread
+    copy = User.__mapper__.class_manager.new_instance()
+    for key in USER_COLUMNS:
+        set_committed_value(copy, key, getattr(user, key))
+    make_transient_to_detached(copy)
+    return copy
+
+
+def load_user(user_id):
+    """Return the user of the token's identity attached to the current session, or None."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return db.session.merge(cached, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        user_cache.set(user_id, _detached_copy(user))
+    return user
+
+
+def forget_user(user_id):
+    """Drop a user's cached copy, e.g. once the user turned out to be deleted."""
+    user_cache.delete(user_id)
+
+
+def reload_user(user_id):
+    """
+    Read a user from the database over the copy in the session and the cache.
+    Returns None, dropping the cached copy, when the user was deleted.
+    """
+    user = db.session.execute(
+        db.select(User).where(User.id == user_id).execution_options(populate_existing=True)
+    ).scalar()
+    if user is None:
+        forget_user(user_id)
+    else:
+        user_cache.set(user_id, _detached_copy(user))
+    return user
+
+
+def refresh_current_user(updated_at):
+    """
+    Reload current_user when users.updated_at read from the database differs from the cached copy's,
+    so a response built from it matches an ETag built from that updated_at.
+    """
+    if current_user.updated_at != updated_at:
+        reload_user(current_user.id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault('changed_users', set())
+    for instance in session.deleted:
+        if isinstance(instance, User):
+            changed.add(instance.id)
+    for instance in session.dirty:
+        if isinstance(instance, User) and session.is_modified(instance, include_collections=False):
+            changed.add(instance.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_changed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        user_cache.delete(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop('changed_users', None)
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+
+from flask import Response, g, request
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # Only needed when METRICS_ENABLED is set
+    prometheus_client = None
+
+from models import db
+from db_pool import pool_stats
+from cache import catalog_cache
+from decorator import internal_only
+
+# Prometheus metrics, opt-in with METRICS_ENABLED.
+# Under gunicorn every worker has its own counters; set PROMETHEUS_MULTIPROC_DIR
+# to an empty directory before starting the server so workers write their
+# samples there and /metrics aggregates them across processes (gunicorn.conf.py
+# cleans up after exited workers). Like /internal/stats, /metrics answers only
+# requests carrying the X-Internal-Token header, so the scrape config has to
+# send it.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+UPLOAD_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_metrics = {}
+_counted = {}  # (metric, labels) -> the running total of this process already counted
+_counted_lock = threading.Lock()
+
+
+def _create_metrics():
+    Counter, Gauge, Histogram = prometheus_client.Counter, prometheus_client.Gauge, prometheus_client.Histogram
+    return {
+        "requests": Counter('http_requests_total', 'HTTP requests', ['endpoint', 'method', 'status']),
+        "latency": Histogram('http_request_duration_seconds', 'HTTP request latency',
+                             ['endpoint', 'method'], buckets=LATENCY_BUCKETS),
+        "response_size": Histogram('http_response_size_bytes', 'HTTP response body size',
+                                   ['endpoint'], buckets=SIZE_BUCKETS),
+        "image_upload": Histogram('image_upload_duration_seconds', 'Background image upload duration, retries included',
+                                  ['outcome'], buckets=UPLOAD_BUCKETS),
+        "pool_checkouts": Counter('db_pool_checkouts', 'DB pool connection checkouts'),
+        "pool_timeouts": Counter('db_pool_timeouts', 'DB pool connection checkouts that timed out'),
+        "pool_wait": Counter('db_pool_wait_seconds', 'Time spent waiting for DB pool connections'),
+        "cache_lookups": Counter('catalog_cache_lookups', 'Catalog cache lookups', ['result']),
+        # Gauges of each live worker, summed over the workers when scraped
+        "pool_connections": Gauge('db_pool_connections', 'Connections of the DB pool by state',
+                                  ['state'], multiprocess_mode='livesum'),
+        "cache_hit_ratio": Gauge('catalog_cache_hit_ratio', 'Catalog cache hit ratio of each worker',
+                                 multiprocess_mode='liveall'),
+    }
+
+
+def record_image_upload(seconds, outcome):
+    """Observe the duration of a background image upload ('done' or 'failed'); no-op when metrics are off."""
+    if _metrics:
+        _metrics["image_upload"].labels(outcome).observe(seconds)
+
+
+def _count(name, total, *labels):
+    # Pool and cache stats are running totals of this process, the counter grows by what they grew since last time
+    with _counted_lock:
+        last = _counted.get((name, labels), 0)
+        _counted[(name, labels)] = total
+    grown = total - last if total >= last else total  # The stats were reset
+    if grown:
+        (_metrics[name].labels(*labels) if labels else _metrics[name]).inc(grown)
+
+
+def _update_stats():
+    stats = pool_stats(db.engine)
+    if stats:
+        for state in ('in_use', 'idle', 'overflow'):
+            _metrics["pool_connections"].labels(state).set(stats[state])
+        _count("pool_checkouts", stats["checkouts"])
+        _count("pool_timeouts", stats["timeouts"])
+        _count("pool_wait", stats["wait_ms_total"] / 1000)
+
+    cache = catalog_cache.stats()
+    _count("cache_lookups", cache["hits"], 'hit')
+    _count("cache_lookups", cache["misses"], 'miss')
+    _metrics["cache_hit_ratio"].set(cache["hit_ratio"])
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def _observe_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None or request.endpoint == 'metrics':
+        return response
+    endpoint = request.endpoint or 'unmatched'  # Keeps unknown URLs from creating label values
+    _metrics["requests"].labels(endpoint, request.method, response.status_code).inc()
+    _metrics["latency"].labels(endpoint, request.method).observe(time.perf_counter() - start)
+    _metrics["response_size"].labels(endpoint).observe(response.calculate_content_length() or 0)
+    _update_stats()
+    return response
+
+
+def metrics():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    _update_stats()
+    return Response(prometheus_client.generate_latest(registry), mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    """Serve /metrics and instrument every request when METRICS_ENABLED is set."""
+    if not app.config['METRICS_ENABLED']:
+        return
+    if prometheus_client is None:
+        raise RuntimeError("METRICS_ENABLED requires the prometheus_client package")
+    if not _metrics:
+        _metrics.update(_create_metrics())
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule('/metrics', 'metrics', internal_only(metrics))
@@ -0,0 +1,51 @@
+"""add lookup indexes
+
+Revision ID: 5b8e2d71c4fa
+Revises: e330b39cf709
+Create Date: 2025-04-17 10:02:51.631874
+
+"""
+from contextlib import nullcontext
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2d71c4fa'
+down_revision = 'e330b39cf709'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_orders_user_id', 'orders', ['user_id', 'id']),
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+    ('ix_order_items_product_id', 'order_items', ['product_id']),
+    ('ix_products_category_id', 'products', ['category_id']),
+    ('ix_favorites_product_id', 'favorites', ['product_id']),
+    ('ix_products_best_seller', 'products', ['best_seller', 'id']),
+]
+
+
+def rating_columns(dialect):
+    # Must match the ORDER BY of the top rated listings; SQLite already sorts NULLs last in DESC order
+    if dialect == 'postgresql':
+        return [sa.text('rating DESC NULLS LAST'), sa.text('id DESC')]
+    return [sa.text('rating DESC'), sa.text('id DESC')]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    # Build the indexes without locking writes on Postgres, which can't run CONCURRENTLY in a transaction
+    with op.get_context().autocommit_block() if dialect == 'postgresql' else nullcontext():
+        for name, table, columns in INDEXES + [('ix_products_rating', 'products', rating_columns(dialect))]:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    with op.get_context().autocommit_block() if dialect == 'postgresql' else nullcontext():
+        for name, table, columns in reversed(INDEXES + [('ix_products_rating', 'products', None)]):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
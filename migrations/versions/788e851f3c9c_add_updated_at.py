@@ -0,0 +1,30 @@
+"""add updated_at
+
+Revision ID: 788e851f3c9c
+Revises: 0ef37464210b
+Create Date: 2025-04-07 14:03:51.220946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '788e851f3c9c'
+down_revision = '0ef37464210b'
+branch_labels = None
+depends_on = None
+
+TABLES = ('products', 'categories', 'sliders', 'users')
+
+
+def upgrade():
+    # Plain ADD COLUMN (no batch table rebuild) so the products_fts triggers survive
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,48 @@
+"""add product filter indexes
+
+Revision ID: d71a3c9e5f20
+Revises: 9c4e1f07b3d2
+Create Date: 2025-04-19 15:12:40.587316
+
+"""
+from contextlib import nullcontext
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd71a3c9e5f20'
+down_revision = '9c4e1f07b3d2'
+branch_labels = None
+depends_on = None
+
+
+def category_rating_columns(dialect):
+    # Must match the ORDER BY of rating sorted listings, like ix_products_rating
+    if dialect == 'postgresql':
+        return ['category_id', sa.text('rating DESC NULLS LAST'), sa.text('id DESC')]
+    return ['category_id', sa.text('rating DESC'), sa.text('id DESC')]
+
+
+def indexes(dialect):
+    return [
+        ('ix_products_price', 'products', ['price', 'id']),
+        ('ix_products_category_price', 'products', ['category_id', 'price', 'id']),
+        ('ix_products_category_rating', 'products', category_rating_columns(dialect)),
+    ]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    with op.get_context().autocommit_block() if dialect == 'postgresql' else nullcontext():
+        for name, table, columns in indexes(dialect):
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    with op.get_context().autocommit_block() if dialect == 'postgresql' else nullcontext():
+        for name, table, columns in reversed(indexes(dialect)):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -1,25 +1,91 @@
+from flask import g, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timezone
 from sqlalchemy.orm import relationship
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, event
 
 db = SQLAlchemy()
 
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WRITE_OPTION = 'sqlite_write'  # Execution option of connections whose transactions write, see begin_write
+
+
+def configure_sqlite(engine, config):
+    """
+    Apply the SQLite production profile to an engine: pragmas on every new connection,
+    and BEGIN IMMEDIATE for the transactions of write requests and of begin_write.
+    """
+    if engine.dialect.name != 'sqlite' or not config['SQLITE_TUNING']:
+        return
+
+    pragmas = [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # SQLAlchemy emits BEGIN itself (below) instead of the sqlite3 module
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin_sqlite_transaction(connection):
+        if connection.get_execution_options().get('isolation_level') == 'AUTOCOMMIT':
+            return
+        # A deferred transaction that has read can't wait for the write lock when it
+        # starts writing, it fails with "database is locked" at once. Write requests
+        # and writers outside requests take the lock up front, where busy_timeout applies.
+        # Views marked with decorator.deferred_writes call begin_write themselves.
+        write = (connection.get_execution_options().get(WRITE_OPTION)
+                 or has_request_context() and request.method not in READ_METHODS
+                 and not g.get('deferred_writes'))
+        connection.exec_driver_sql('BEGIN IMMEDIATE' if write else 'BEGIN')
+
+
+def begin_write():
+    """
+    Start the session's transaction as a write transaction (BEGIN IMMEDIATE on SQLite).
+    Write requests get one on their own; background workers and CLI commands call this
+    before the first statement of each transaction that writes.
+    """
+    db.session.connection(execution_options={WRITE_OPTION: True})
+
 class Slider(db.Model):
     __tablename__ = 'sliders'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(255), nullable=True) 
     image_path = db.Column(db.String(255), nullable=True)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc), nullable=True)
 
     def __repr__(self):
         return f'<Slider {self.title}>'
+
+
+# Single-row table holding the catalog version, bumped on every catalog write
+class CatalogState(db.Model):
+    __tablename__ = 'catalog_state'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f'<CatalogState v{self.version}>'
     
 # Association Table for Many-to-Many (Users & Favorite Products)
 favorites = db.Table(
     'favorites',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('product_id', db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    db.Column('product_id', db.Integer, db.ForeignKey('products.id'), primary_key=True),
+    db.Index('ix_favorites_product_id', 'product_id'),  # The primary key only covers user_id lookups
 )
 class User(db.Model):
     __tablename__ = 'users'
@@ -30,6 +96,10 @@ class User(db.Model):
     password = db.Column(db.String(255), nullable=False)
     pass_hidden = db.Column(db.String(255), nullable=False)
     image_path = db.Column(db.String(255), nullable=True)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc), nullable=True)
+    blocked = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Tokens carry it, bumped to revoke them
     
     # Relationship: User can have many favorite products
     favorite_products = db.relationship('Product', secondary=favorites, lazy='dynamic')
@@ -46,6 +116,8 @@ class Category(db.Model):
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(255), nullable=True) 
     image_path = db.Column(db.String(255), nullable=True)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc), nullable=True)
     
     # Relationship: One Category -> Many Products
     products = db.relationship('Product', backref='category', lazy=True)
@@ -66,10 +138,22 @@ class Product(db.Model):
     image_path = db.Column(db.String(255), nullable=True)
     rating = db.Column(db.Float, nullable=True)
     best_seller = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc), nullable=True)
     
 
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False, index=True)
 
+    __table_args__ = (
+        # Top rated listings order by rating desc with NULLs last, then id
+        # (the migrations add NULLS LAST explicitly on Postgres)
+        db.Index('ix_products_rating', db.desc('rating'), db.desc('id')),
+        db.Index('ix_products_best_seller', 'best_seller', 'id'),
+        # Filtered and sorted /products listings
+        db.Index('ix_products_price', 'price', 'id'),
+        db.Index('ix_products_category_price', 'category_id', 'price', 'id'),
+        db.Index('ix_products_category_rating', 'category_id', db.desc('rating'), db.desc('id')),
+    )
 
     def __repr__(self):
         return f"<Product {self.name}>"
@@ -93,6 +177,10 @@ class Order(db.Model):
     # Relationship: Order contains multiple items (products + quantity)
     order_items = db.relationship('OrderItem', backref='order', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_orders_user_id', 'user_id', 'id'),  # A user's orders in id order
+    )
+
     def __repr__(self):
         return f"<Order {self.id} - {self.status}>"
 
@@ -102,8 +190,8 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
 
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     current_unit_price = db.Column(db.Float, nullable=False)
 
@@ -113,5 +201,62 @@ class OrderItem(db.Model):
         return f"<OrderItem Order:{self.order_id} Product:{self.product_id} Qty:{self.quantity}>"
 
 
+# Append-only log of token revocations and (un)blocks, replayed by every worker into its denylist
+class UserRevocation(db.Model):
+    __tablename__ = 'user_revocations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    token_version = db.Column(db.Integer, nullable=False)
+    blocked = db.Column(db.Boolean, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_user_revocations_created_at', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<UserRevocation user {self.user_id} v{self.token_version}>'
+
+
+# Image upload handed to the background upload pool, target is the row whose image_path receives the URL
+class ImageUpload(db.Model):
+    __tablename__ = 'image_uploads'
+
+    id = db.Column(db.Integer, primary_key=True)
+    target_table = db.Column(db.String(50), nullable=False)
+    target_id = db.Column(db.Integer, nullable=False)
+    folder = db.Column(db.String(100), nullable=False)
+    spool_path = db.Column(db.String(255), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the file, its storage key
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, uploading, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(255), nullable=True)
+    image_url = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_image_uploads_status', 'status'),
+        db.Index('ix_image_uploads_target', 'target_table', 'target_id'),
+    )
 
+    def __repr__(self):
+        return f"<ImageUpload {self.target_table}:{self.target_id} {self.status}>"
+
+
+# Remote image waiting to be deleted, drained in batches by the background deletion worker
+class ImageDeletion(db.Model):
+    __tablename__ = 'image_deletions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    image_url = db.Column(db.String(255), nullable=False)
+    public_id = db.Column(db.String(255), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    last_error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f"<ImageDeletion {self.public_id} attempts:{self.attempts}>"
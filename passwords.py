@@ -0,0 +1,64 @@
+import threading
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing.
+# Hashing is slow on purpose and holds the GIL, so it runs on a small pool of
+# PASSWORD_HASH_WORKERS processes per worker: the request thread only waits for
+# the result and the worker's other threads keep serving. The pool is created
+# on first use with the spawn start method, forking a threaded server is unsafe.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if workers <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def _run(func, *args):
+    global _executor
+    executor = _get_executor()
+    if executor is None:
+        return func(*args)
+    try:
+        return executor.submit(func, *args).result()
+    except BrokenProcessPool:
+        # A hashing process died, start a new pool on the next call and answer this one here
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+        return func(*args)
+
+
+def hash_password(password):
+    """Hash a password with the configured method."""
+    config = current_app.config
+    return _run(generate_password_hash, password, config['PASSWORD_HASH_METHOD'], config['PASSWORD_SALT_LENGTH'])
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=None)
+def _stored_method(method):
+    # The method as written into hashes, with werkzeug's defaults filled in ('scrypt' -> 'scrypt:32768:8:1')
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """Whether a hash was made with another method or other parameters than the configured ones."""
+    return password_hash.split('$', 1)[0] != _stored_method(current_app.config['PASSWORD_HASH_METHOD'])
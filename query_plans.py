@@ -0,0 +1,113 @@
+import re
+
+from sqlalchemy import text
+
+from models import db, favorites, Category, Product, Order, OrderItem
+from seed_data import seed
+from search import apply_search
+from api.routes.catalog import (PRODUCT_COLUMNS, product_rows_query, category_rows_query,
+                                product_filter_conditions, facet_counts_query)
+from api.routes.shared_functions import keyset_paginate
+
+# Query plan checks for the hot endpoint queries.
+# check_query_plans seeds a large synthetic dataset inside a transaction, runs
+# EXPLAIN on the main query of each endpoint and reports every sequential scan,
+# then rolls everything back so the database is left untouched.
+
+PAGE_SIZE = 20
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def endpoint_queries():
+    """
+    Return (name, statement, paged table) for the main query of each endpoint.
+    The paged table is walked in primary key order, which SQLite reports as a plain SCAN of the rowid table.
+    """
+    search_stmt = apply_search(product_rows_query(), 'product 42')[0]
+    return [
+        ('/products?limit', keyset_paginate(product_rows_query(), Product.id, PAGE_SIZE, None), 'products'),
+        ('/top_rated_products', product_rows_query()
+            .order_by(Product.rating.desc().nulls_last(), Product.id.desc()).limit(2), None),
+        ('/top_rated_products?limit', keyset_paginate(product_rows_query(), Product.id, PAGE_SIZE, (3.0, 500),
+                                                      sort_column=Product.rating, descending=True), None),
+        ('/best_seller_products', product_rows_query().where(Product.best_seller == 1).order_by(Product.id), None),
+        ('/categories?limit', keyset_paginate(category_rows_query(), Category.id, PAGE_SIZE, None), 'categories'),
+        ('/categories?fields=product_count', keyset_paginate(category_rows_query(product_count=True), Category.id,
+                                                             PAGE_SIZE, None), 'categories'),
+        ('/category/<id>/products', keyset_paginate(product_rows_query().where(Product.category_id == 1), Product.id,
+                                                    PAGE_SIZE, None), None),
+        ('/category/<id>/products?sort=-rating', keyset_paginate(product_rows_query().where(Product.category_id == 1),
+                                                                 Product.id, PAGE_SIZE, (3.0, 500),
+                                                                 sort_column=Product.rating, descending=True), None),
+        ('/categories products', db.select(*PRODUCT_COLUMNS)
+            .where(Product.category_id.in_([1, 2, 3])).order_by(Product.id), None),
+        ('/products?category_id&sort=price', keyset_paginate(
+            product_rows_query().where(*product_filter_conditions({'category_ids': (1,), 'max_price': 500})),
+            Product.id, PAGE_SIZE, None, sort_column=Product.price), None),
+        ('/products?category_id&sort=-rating', keyset_paginate(
+            product_rows_query().where(*product_filter_conditions({'category_ids': (1,), 'min_rating': 3})),
+            Product.id, PAGE_SIZE, None, sort_column=Product.rating, descending=True), None),
+        ('/products?min_price&sort=price', keyset_paginate(
+            product_rows_query().where(*product_filter_conditions({'min_price': 900})),
+            Product.id, PAGE_SIZE, (950, 10), sort_column=Product.price), None),
+        ('/products facets', facet_counts_query({'category_ids': (1, 2), 'min_rating': 3}), None),
+        ('/products/search', search_stmt.limit(PAGE_SIZE), None),
+        ('favorite ids', db.select(favorites.c.product_id).where(favorites.c.user_id == 1), None),
+        ('/get_user_data favorites', db.select(Product).join(favorites, favorites.c.product_id == Product.id)
+            .where(favorites.c.user_id == 1), None),
+        ('/orders', keyset_paginate(db.select(Order).where(Order.user_id == 1), Order.id, PAGE_SIZE, None), None),
+        ('/orders items', db.select(OrderItem).where(OrderItem.order_id.in_([1, 2, 3])), None),
+        ('/place_order products', db.select(Product.id, Product.name, Product.price)
+            .where(Product.id.in_([1, 2, 3])), None),
+        ('/product delete favorites', db.select(favorites).where(favorites.c.product_id == 1), None),
+        ('/product delete order items', db.select(OrderItem.id).where(OrderItem.product_id == 1), None),
+        ('/category delete products', db.select(Product.id).where(Product.category_id == 1), None),
+    ]
+
+
+def seed_large_dataset(n_products):
+    """
+    Seed a catalog of n_products with proportional users, favorites and orders, then refresh statistics.
+    At least 100 categories, so that a few of them select few products on small datasets too.
+    """
+    seed(users=max(n_products // 10, 1), categories=max(n_products // 100, 100), products=n_products,
+         favorites_per_user=5, orders_per_user=10, items_per_order=3)
+    db.session.execute(text('ANALYZE'))
+
+
+def explain(stmt):
+    """Return the plan lines and the tables read with a sequential scan."""
+    sql = str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+    if db.engine.dialect.name == 'sqlite':
+        lines = [row[3] for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        scans = [match.group(1) for match in map(SQLITE_SCAN.match, lines) if match]
+    else:
+        lines = [row[0] for row in db.session.execute(text(f"EXPLAIN {sql}"))]
+        scans = [match.group(1) for line in lines for match in POSTGRES_SCAN.finditer(line)]
+    return lines, scans
+
+
+def check_query_plans(n_products=20000, verbose=False):
+    """
+    Seed a large dataset, EXPLAIN each endpoint query and roll back.
+    Returns {query name: [tables scanned sequentially]} for the queries that scan.
+    """
+    failures = {}
+    queries = endpoint_queries()  # Built first, the search setup probes the schema on its own connection
+    try:
+        seed_large_dataset(n_products)
+        for name, stmt, paged_table in queries:
+            lines, scans = explain(stmt)
+            if db.engine.dialect.name == 'sqlite':
+                scans = [table for table in scans if table != paged_table]
+            if scans:
+                failures[name] = scans
+            if verbose or scans:
+                print(f"{'FAIL' if scans else 'ok  '} {name}")
+                for line in lines:
+                    print(f"       {line}")
+    finally:
+        db.session.rollback()
+    return failures
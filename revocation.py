@@ -0,0 +1,139 @@
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, User, UserRevocation
+
+# Token revocation and blocked users.
+# Tokens carry their user's token_version in the 'ver' claim. Bumping the version
+# revokes every token issued before, blocking (which bumps it too) rejects all of
+# the user's tokens. Each bump is logged in user_revocations in the same
+# transaction, and every worker replays that log into an in-memory denylist of
+# user_id -> (token_version, blocked), reading only rows it has not seen at most
+# every REVOCATION_REFRESH_SECONDS. Checking a token therefore costs no query;
+# changes committed by a worker reach its own denylist immediately.
+
+VERSION_CLAIM = 'ver'
+LATE_COMMIT_WINDOW = 60  # Seconds, rows committed this long after their insert are still picked up
+
+
+class Denylist:
+
+    def __init__(self):
+        self._entries = {}
+        self._last_id = None  # None until the log was read once
+        self._last_refresh = None
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def apply(self, user_id, token_version, blocked):
+        # Versions only grow, so rows can be applied in any order and more than once
+        with self._lock:
+            current = self._entries.get(user_id)
+            if current is None or token_version >= current[0]:
+                self._entries[user_id] = (token_version, blocked)
+
+    def refresh_if_due(self, interval):
+        now = time.monotonic()
+        if now < self._next_refresh or not self._lock.acquire(blocking=False):
+            return
+        try:
+            if now < self._next_refresh:
+                return
+            self._next_refresh = now + interval
+            last_id, last_refresh = self._last_id, self._last_refresh
+        finally:
+            self._lock.release()
+
+        started = datetime.now(timezone.utc)
+        query = db.select(UserRevocation.id, UserRevocation.user_id,
+                          UserRevocation.token_version, UserRevocation.blocked)
+        if last_id is not None:
+            # Ids are taken at insert, so a row committed late can have a lower id than one already read
+            since = (last_refresh - timedelta(seconds=LATE_COMMIT_WINDOW)).replace(tzinfo=None)
+            query = query.where((UserRevocation.id > last_id) | (UserRevocation.created_at >= since))
+        rows = db.session.execute(query).all()
+
+        for row in rows:
+            self.apply(row.user_id, row.token_version, row.blocked)
+        with self._lock:
+            self._last_id = max([row.id for row in rows] + [last_id or 0])
+            self._last_refresh = started
+
+    def get(self, user_id):
+        return self._entries.get(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._last_id = self._last_refresh = None
+            self._next_refresh = 0.0
+
+
+denylist = Denylist()
+
+
+def _user_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def token_claims(user):
+    """Additional claims of the user's access and refresh tokens."""
+    return {VERSION_CLAIM: user.token_version}
+
+
+def is_token_revoked(jwt_payload):
+    """Whether a decoded token was revoked or its user is blocked."""
+    denylist.refresh_if_due(current_app.config['REVOCATION_REFRESH_SECONDS'])
+    entry = denylist.get(_user_id(jwt_payload.get(current_app.config['JWT_IDENTITY_CLAIM'])))
+    if entry is None:
+        return False
+    token_version, blocked = entry
+    return blocked or jwt_payload.get(VERSION_CLAIM, 0) < token_version
+
+
+def is_blocked(user_id):
+    entry = denylist.get(_user_id(user_id))
+    return bool(entry and entry[1])
+
+
+def revoke_tokens(user):
+    """Revoke every token issued to the user so far, takes effect on commit."""
+    user.token_version = (user.token_version or 0) + 1
+
+
+def set_blocked(user, blocked=True):
+    """Block or unblock the user, revoking their tokens; takes effect on commit."""
+    user.blocked = blocked
+    revoke_tokens(user)
+
+
+@event.listens_for(Session, 'after_flush')
+def log_revocations(session, flush_context):
+    """Log every token_version bump in the same transaction as the change."""
+    rows = []
+    for instance in list(session.dirty) + list(session.deleted):  # Deleting a user revokes its tokens too
+        if isinstance(instance, User) and inspect(instance).attrs.token_version.history.has_changes():
+            rows.append({"user_id": instance.id, "token_version": instance.token_version,
+                         "blocked": bool(instance.blocked), "created_at": datetime.now(timezone.utc)})
+    if rows:
+        session.connection().execute(UserRevocation.__table__.insert(), rows)
+        session.info.setdefault('revocations', []).extend(rows)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_revocations(session):
+    for row in session.info.pop('revocations', ()):
+        denylist.apply(row["user_id"], row["token_version"], row["blocked"])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_revocations(session):
+    session.info.pop('revocations', None)
@@ -0,0 +1,83 @@
+import re
+from sqlalchemy import func, literal_column, text
+
+from models import db, Product
+
+# Full-text product search.
+# SQLite uses the products_fts FTS5 table (external content, kept in sync with
+# products by triggers), Postgres uses a GIN index over a weighted tsvector of
+# name and description. Both are created by the add_product_search migration.
+# Other databases, or a SQLite file created without migrations, fall back to ILIKE.
+
+FTS_TABLE = 'products_fts'
+
+# Name matches weigh more than description matches
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_fts_tables = {}
+
+
+def search_terms(search_query):
+    """Split a search query into the word tokens used for prefix matching."""
+    return re.findall(r'\w+', search_query.lower())
+
+
+def postgres_document():
+    """The tsvector expression indexed by ix_products_search (must match the migration)."""
+    return func.setweight(func.to_tsvector('simple', Product.name), 'A').op('||')(
+        func.setweight(func.to_tsvector('simple', func.coalesce(Product.description, '')), 'B')
+    )
+
+
+def has_fts_table():
+    """Check once per engine whether the SQLite FTS5 table exists."""
+    engine = db.engine
+    if engine not in _fts_tables:
+        with engine.connect() as connection:
+            _fts_tables[engine] = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": FTS_TABLE},
+            ).first() is not None
+    return _fts_tables[engine]
+
+
+def apply_search(stmt, search_query):
+    """
+    Restrict a product select to the rows matching search_query.
+    Returns (stmt, rank, descending) where rank is the relevance expression to order by
+    (None on the ILIKE fallback, which orders by id) and descending its sort direction.
+    """
+    terms = search_terms(search_query)
+    dialect = db.engine.dialect.name
+
+    if terms and dialect == 'sqlite' and has_fts_table():
+        match = ' '.join(f'"{term}"*' for term in terms)
+        rank = func.bm25(literal_column(FTS_TABLE), NAME_WEIGHT, DESCRIPTION_WEIGHT)
+        stmt = stmt.join(
+            db.table(FTS_TABLE, db.column('rowid')),
+            literal_column(f'{FTS_TABLE}.rowid') == Product.id,
+        ).where(literal_column(FTS_TABLE).op('MATCH')(match))
+        return stmt.add_columns(rank), rank, False
+
+    if terms and dialect == 'postgresql':
+        query = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        document = postgres_document()
+        # ts_rank returns real: cast it so the cursor's value compares equal to the selected one
+        rank = func.ts_rank(document, query).cast(db.Float(53))
+        stmt = stmt.where(document.op('@@')(query))
+        return stmt.add_columns(rank), rank, True
+
+    pattern = f"%{search_query}%"
+    stmt = stmt.where(db.or_(Product.name.ilike(pattern), Product.description.ilike(pattern)))
+    return stmt, None, False
+
+
+def rebuild_search_index():
+    """Rebuild the full-text index from the products table."""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite' and has_fts_table():
+        db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        db.session.execute(text("REINDEX INDEX ix_products_search"))
+    db.session.commit()
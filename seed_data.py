@@ -0,0 +1,79 @@
+import random
+
+from werkzeug.security import generate_password_hash
+
+from models import db, favorites, User, Category, Product, Order, OrderItem
+
+# Deterministic synthetic data for benchmarks and query plan checks.
+# The same volumes and rng seed always produce the same rows; ids continue after
+# the rows already in the database. Nothing is committed, callers decide.
+
+SEED_PASSWORD = 'password'
+
+
+def seed(users, categories, products, favorites_per_user=5, orders_per_user=3, items_per_order=3, rng_seed=42):
+    """
+    Insert the given volumes of users, categories, products, favorites and orders.
+    Every user's password is SEED_PASSWORD. Returns the id ranges of the seeded rows.
+    """
+    rng = random.Random(rng_seed)
+    password = generate_password_hash(SEED_PASSWORD)  # Hashed once, hashing is slow on purpose
+
+    def first_id(model):
+        return (db.session.execute(db.select(db.func.max(model.id))).scalar() or 0) + 1
+
+    category_base, product_base, user_base, order_base = (
+        first_id(Category), first_id(Product), first_id(User), first_id(Order)
+    )
+    categories = max(categories, 1)
+
+    db.session.execute(db.insert(Category), [
+        {"id": category_base + i, "title": f"Category {category_base + i}", "description": f"Seeded category {i}"}
+        for i in range(categories)
+    ])
+    if products:
+        db.session.execute(db.insert(Product), [
+            {"id": product_base + i, "name": f"Seeded product {product_base + i}",
+             "description": f"Seeded product {i} in a {rng.choice(['red', 'blue', 'green'])} box",
+             "price": rng.randint(1, 1000), "rating": rng.choice([None, 1, 2, 3, 3.5, 4, 4.5, 5]),
+             "best_seller": int(rng.random() < 0.05), "category_id": category_base + rng.randrange(categories)}
+            for i in range(products)
+        ])
+    if users:
+        db.session.execute(db.insert(User), [
+            {"id": user_base + i, "name": f"User {user_base + i}", "email": f"seed{user_base + i}@example.com",
+             "phone": f"seed{user_base + i}", "password": password, "pass_hidden": password}
+            for i in range(users)
+        ])
+
+    if users and products:
+        favorite_rows = [
+            {"user_id": user_base + i, "product_id": product_id}
+            for i in range(users)
+            for product_id in sorted({product_base + rng.randrange(products) for _ in range(favorites_per_user)})
+        ]
+        if favorite_rows:
+            db.session.execute(favorites.insert(), favorite_rows)
+
+        order_count = users * orders_per_user
+        if order_count:
+            db.session.execute(db.insert(Order), [
+                {"id": order_base + i, "user_id": user_base + i // orders_per_user, "status": rng.randrange(3),
+                 "subtotal": 10 * items_per_order, "tax": 0, "shipping": 0, "total": 10 * items_per_order}
+                for i in range(order_count)
+            ])
+            if items_per_order:
+                db.session.execute(db.insert(OrderItem), [
+                    {"order_id": order_base + i, "product_id": product_base + rng.randrange(products),
+                     "quantity": 1, "current_unit_price": 10}
+                    for i in range(order_count) for _ in range(items_per_order)
+                ])
+    else:
+        order_count = 0
+
+    return {
+        "users": range(user_base, user_base + users),
+        "categories": range(category_base, category_base + categories),
+        "products": range(product_base, product_base + products),
+        "orders": range(order_base, order_base + order_count),
+    }
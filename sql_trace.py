@@ -0,0 +1,139 @@
+import re
+import time
+import logging
+import threading
+from collections import Counter, deque
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+from models import db
+
+# Per-request SQL tracing.
+# Cursor events count the statements of each request, their total time and how
+# often each statement shape (fingerprint) repeats. When a request is done the
+# trace is logged if a statement repeated enough to look like an N+1 loop, and
+# each endpoint's query count is compared with the size of its JSON result to
+# flag endpoints whose query count grows with the result. In debug mode the
+# numbers are also sent back in a Server-Timing header.
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_PER_ENDPOINT = 50
+
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+_samples = {}  # endpoint -> deque of (result size, query count)
+_flagged = set()
+_samples_lock = threading.Lock()
+
+
+def fingerprint(statement):
+    """Reduce a statement to its shape: literals and IN lists of any length look the same."""
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    statement = _LITERAL.sub('?', statement)
+    return _PLACEHOLDER_LIST.sub('(?)', statement)
+
+
+def result_size(value):
+    """Count the objects in the lists of a JSON document, a measure of how much a response returned."""
+    if isinstance(value, list):
+        return len(value) + sum(result_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(result_size(item) for item in value.values())
+    return 0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('sql_trace_start', []).append(time.perf_counter())
+
+
+def _end_statement(conn, statement):
+    if not has_request_context() or not conn.info.get('sql_trace_start'):
+        return
+    elapsed = time.perf_counter() - conn.info['sql_trace_start'].pop()
+    trace = g.get('sql_trace')
+    if trace is not None:
+        trace['count'] += 1
+        trace['time'] += elapsed
+        trace['statements'][fingerprint(statement)] += 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _end_statement(conn, statement)
+
+
+def _handle_error(exception_context):
+    # A failed statement gets no after_cursor_execute, its start time must not stay on the connection
+    if exception_context.connection is not None:
+        _end_statement(exception_context.connection, exception_context.statement or '')
+
+
+def _start_trace():
+    g.sql_trace = {'count': 0, 'time': 0.0, 'statements': Counter(), 'start': time.perf_counter()}
+
+
+def _record_growth(endpoint, size, count, threshold):
+    # Flag an endpoint once when a larger result took at least threshold more queries than a
+    # smaller one (a few queries of difference are cache hits and misses, not growth)
+    with _samples_lock:
+        samples = _samples.setdefault(endpoint, deque(maxlen=SAMPLES_PER_ENDPOINT))
+        samples.append((size, count))
+        if endpoint in _flagged:
+            return None
+        smallest = min(samples)
+        largest = max(samples)
+        if largest[0] > smallest[0] and largest[1] - smallest[1] >= threshold:
+            _flagged.add(endpoint)
+            return smallest, largest
+    return None
+
+
+def _finish_trace(app, response):
+    trace = g.pop('sql_trace', None)
+    if trace is None:
+        return response
+
+    endpoint = request.endpoint or request.path
+    threshold = app.config['SQL_TRACE_REPEAT_THRESHOLD']
+    repeated = {statement: n for statement, n in trace['statements'].items() if n >= threshold}
+    if repeated:
+        logger.warning(
+            "Repeated statements on %s: %s queries in total, %s repeated", endpoint, trace['count'], len(repeated),
+            extra={"sql_trace": {"event": "repeated_statements", "endpoint": endpoint,
+                                 "queries": trace['count'], "repeated": repeated}},
+        )
+
+    if response.is_json and trace['count']:
+        growth = _record_growth(endpoint, result_size(response.get_json(silent=True)), trace['count'], threshold)
+        if growth:
+            (small_size, small_count), (large_size, large_count) = growth
+            logger.warning(
+                "Query count of %s grows with result size: %s queries for %s items, %s for %s",
+                endpoint, small_count, small_size, large_count, large_size,
+                extra={"sql_trace": {"event": "query_count_grows", "endpoint": endpoint,
+                                     "samples": [list(growth[0]), list(growth[1])]}},
+            )
+
+    if app.debug:
+        total = time.perf_counter() - trace['start']
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={trace["time"] * 1000:.2f};desc="{trace["count"]} queries", app;dur={total * 1000:.2f}'
+        )
+    return response
+
+
+def init_sql_tracing(app):
+    """Trace the queries of every request when SQL_TRACE is set or the app runs in debug mode."""
+    if not (app.config['SQL_TRACE'] or app.debug):
+        return
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(db.engine, 'handle_error', _handle_error)
+    app.before_request(_start_trace)
+    app.after_request(lambda response: _finish_trace(app, response))
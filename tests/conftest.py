@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The tests run the app on a SQLite database migrated in a temporary directory.
+# Every test module starts with empty tables and seeds what it needs with
+# seed_data.seed; the rows are deleted again once the module is done.
+#
+#   python -m pytest tests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKDIR = tempfile.mkdtemp(prefix='tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ['UPLOAD_SPOOL_DIR'] = os.path.join(WORKDIR, 'spool')
+os.environ['SQL_TRACE'] = '0'
+os.environ['METRICS_ENABLED'] = '0'
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+os.environ['REVOCATION_REFRESH_SECONDS'] = '3600'  # Tests refresh the denylist themselves
+os.environ.pop('FLASK_DEBUG', None)
+sys.path.insert(0, ROOT)
+
+from flask_migrate import upgrade  # noqa: E402
+
+from app import app as flask_app  # noqa: E402
+from models import db, CatalogState  # noqa: E402
+from cache import catalog_cache  # noqa: E402
+from identity import user_cache  # noqa: E402
+from revocation import denylist  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    with flask_app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+    return flask_app
+
+
+@pytest.fixture(scope='module', autouse=True)
+def empty_database(app):
+    yield
+    with app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            if table is not CatalogState.__table__:
+                db.session.execute(table.delete())
+        db.session.commit()
+    catalog_cache.clear()
+    user_cache.clear()
+    denylist.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,98 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from models import db, User, Product, Category, Order
+from revocation import token_claims
+from seed_data import seed
+
+# Keyset pagination of the listings, see keyset_paginate in api/routes/shared_functions.py.
+# Walks every page through next_cursor and checks each row comes exactly once, in
+# the order of the listing. The seeded prices and ratings have ties and NULL
+# ratings, which the cursor has to page across.
+
+LIMIT = 7
+
+
+@pytest.fixture(scope='module')
+def token(app):
+    with app.app_context():
+        seeded = seed(1, 12, 200, favorites_per_user=0, orders_per_user=30)
+        db.session.commit()
+        user = db.session.get(User, seeded["users"][0])
+        return create_access_token(identity=user.id, additional_claims=token_claims(user))
+
+
+def walk(client, token, url, page_ids):
+    """Follow next_cursor from the first page to the last, returns the ids in the order served."""
+    headers = {'Authorization': f'Bearer {token}'}
+    ids, cursor = [], ''
+    while True:
+        response = client.get(f'{url}&limit={LIMIT}&cursor={cursor}', headers=headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        page = page_ids(body)
+        assert len(page) <= LIMIT
+        ids.extend(page)
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def product_ids(body):
+    return [product["id"] for product in body["products"]]
+
+
+def category_ids(body):
+    return [category["id"] for category in body["categories"]]
+
+
+def expected_products(app, sort=None, descending=False):
+    # Listing order: the sort value with NULLs last, then the id, both in the requested direction
+    sign = -1 if descending else 1
+    with app.app_context():
+        products = db.session.execute(db.select(Product.id, Product.price, Product.rating)).all()
+    if sort is None:
+        return sorted((product.id for product in products), key=lambda id: sign * id)
+    return [product.id for product in sorted(products, key=lambda product: (
+        getattr(product, sort) is None, sign * (getattr(product, sort) or 0), sign * product.id))]
+
+
+@pytest.mark.parametrize('sort, column, descending', [
+    ('id', None, False),
+    ('-id', None, True),
+    ('price', 'price', False),
+    ('-price', 'price', True),
+    ('rating', 'rating', False),
+    ('-rating', 'rating', True),
+])
+def test_products_pages(app, client, token, sort, column, descending):
+    ids = walk(client, token, f'/api/products?sort={sort}', product_ids)
+    assert ids == expected_products(app, column, descending)
+
+
+def test_top_rated_products_pages(app, client, token):
+    ids = walk(client, token, '/api/top_rated_products?', product_ids)
+    assert ids == expected_products(app, 'rating', descending=True)
+
+
+def test_categories_pages(app, client, token):
+    ids = walk(client, token, '/api/categories?', category_ids)
+    with app.app_context():
+        assert ids == db.session.scalars(db.select(Category.id).order_by(Category.id)).all()
+
+
+def test_orders_pages(app, client, token):
+    # Every page is split by status, its ids are in order once merged
+    def page_ids(body):
+        return sorted(order["id"] for orders in body["orders"].values() for order in orders)
+
+    ids = walk(client, token, '/api/orders?', page_ids)
+    with app.app_context():
+        assert ids == db.session.scalars(db.select(Order.id).order_by(Order.id)).all()
+
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=-1', 'limit=ten', 'cursor=not-a-cursor', 'limit=5&cursor=W1td'])
+def test_invalid_page_params(client, token, query):
+    response = client.get(f'/api/products?{query}', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 400
+    assert response.get_json()["status"] is False
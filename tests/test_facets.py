@@ -0,0 +1,111 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from models import db, User, Product
+from revocation import token_claims
+from seed_data import seed
+from api.routes.catalog import PRICE_BUCKETS, RATING_BUCKETS
+
+# Filters and facet counts of /products, see facet_counts_query in api/routes/catalog.py.
+# The expected listing and counts are computed here from every product row: each
+# facet counts the products matching the other filters, its own filter left out.
+
+
+@pytest.fixture(scope='module')
+def token(app):
+    with app.app_context():
+        seeded = seed(1, 6, 300, favorites_per_user=0, orders_per_user=0)
+        db.session.commit()
+        user = db.session.get(User, seeded["users"][0])
+        return create_access_token(identity=user.id, additional_claims=token_claims(user))
+
+
+@pytest.fixture(scope='module')
+def products(app, token):  # Seeded by the token fixture
+    with app.app_context():
+        return db.session.execute(db.select(
+            Product.id, Product.category_id, Product.price, Product.rating, Product.best_seller
+        )).all()
+
+
+def matches(product, filters, exclude=None):
+    if 'category_ids' in filters and exclude != 'category' and product.category_id not in filters['category_ids']:
+        return False
+    if exclude != 'price':
+        if 'min_price' in filters and product.price < filters['min_price']:
+            return False
+        if 'max_price' in filters and product.price > filters['max_price']:
+            return False
+    if 'min_rating' in filters and exclude != 'rating' and (
+            product.rating is None or product.rating < filters['min_rating']):
+        return False
+    return 'best_seller' not in filters or product.best_seller == filters['best_seller']
+
+
+def bucket(bounds, value):
+    index = None if value is None else max((i for i, bound in enumerate(bounds) if value >= bound), default=None)
+    if index is None:
+        return {"min": None, "max": None}
+    return {"min": bounds[index], "max": bounds[index + 1] if index + 1 < len(bounds) else None}
+
+
+def expected_facets(products, filters):
+    def counts(name, key):
+        found = {}
+        for product in products:
+            if matches(product, filters, exclude=name):
+                value = key(product)
+                found[value] = found.get(value, 0) + 1
+        return found
+
+    def buckets(name, bounds):
+        found = counts(name, lambda product: tuple(bucket(bounds, getattr(product, name)).items()))
+        return sorted(({**dict(value), "count": count} for value, count in found.items()),
+                      key=lambda facet: (facet["min"] is None, facet["min"] or 0))
+
+    categories = counts('category', lambda product: product.category_id)
+    return {
+        "category": [{"id": id, "count": count} for id, count in sorted(categories.items())],
+        "price": buckets('price', PRICE_BUCKETS),
+        "rating": buckets('rating', RATING_BUCKETS),
+    }
+
+
+def get_products(client, token, query):
+    return client.get(f'/api/products?{query}', headers={'Authorization': f'Bearer {token}'})
+
+
+@pytest.mark.parametrize('query, filters', [
+    ('facets=1', {}),
+    ('category_id={0}', {'category_ids': (0,)}),
+    ('category_id={0},{1}&min_price=100', {'category_ids': (0, 1), 'min_price': 100}),
+    ('min_price=25&max_price=500&min_rating=3', {'min_price': 25, 'max_price': 500, 'min_rating': 3}),
+    ('min_rating=4.5&best_seller=0', {'min_rating': 4.5, 'best_seller': 0}),
+    ('max_price=0.5', {'max_price': 0.5}),
+])
+def test_filters_and_facet_counts(client, token, products, query, filters):
+    category_ids = sorted({product.category_id for product in products})
+    if 'category_ids' in filters:
+        filters = {**filters, 'category_ids': tuple(category_ids[i] for i in filters['category_ids'])}
+    response = get_products(client, token, query.format(*category_ids))
+    assert response.status_code == 200
+    body = response.get_json()
+
+    assert [product["id"] for product in body["products"]] == sorted(
+        product.id for product in products if matches(product, filters))
+    assert body["facets"] == expected_facets(products, filters)
+
+
+def test_no_facets_without_filters(client, token, products):
+    body = get_products(client, token, '').get_json()
+    assert "facets" not in body
+    assert len(body["products"]) == len(products)
+
+
+@pytest.mark.parametrize('query', [
+    'category_id=shoes', 'category_id=1,x', 'min_price=cheap', 'max_price=inf', 'min_rating=nan', 'best_seller=maybe',
+])
+def test_invalid_filters(client, token, query):
+    response = get_products(client, token, query)
+    assert response.status_code == 400
+    assert response.get_json()["status"] is False
@@ -0,0 +1,102 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from models import db, User
+from revocation import token_claims
+from seed_data import seed
+from api.routes.fieldsets import RESOURCES
+
+# Sparse fieldsets, see api/routes/fieldsets.py.
+# Without fields or include every endpoint keeps its legacy shape; with them a
+# response holds exactly the asked-for keys, and a field or include the resource
+# does not have is rejected with a 400.
+
+
+@pytest.fixture(scope='module')
+def token(app):
+    with app.app_context():
+        seeded = seed(1, 3, 20, favorites_per_user=5, orders_per_user=3)
+        db.session.commit()
+        user = db.session.get(User, seeded["users"][0])
+        return create_access_token(identity=user.id, additional_claims=token_claims(user))
+
+
+def fields(resource):
+    return set(RESOURCES[resource][0])
+
+
+def get(client, token, url):
+    response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+    return response.status_code, response.get_json()
+
+
+def orders_of(body):
+    return [order for orders in body["orders"].values() for order in orders]
+
+
+def test_legacy_shapes(client, token):
+    _, body = get(client, token, '/api/products')
+    assert all(set(product) == fields('product') | {'category'} for product in body["products"])
+    assert all(set(product["category"]) == fields('product_category') for product in body["products"])
+
+    _, body = get(client, token, '/api/categories')
+    # No product_count in the legacy shape, it is only served on request
+    assert all(set(category) == fields('product_category') | {'products'} for category in body["categories"])
+
+    _, body = get(client, token, '/api/get_user_data')
+    assert set(body["user"]) == fields('user') | {'favorite_products'}
+    assert all(set(product) == fields('favorite_product') for product in body["user"]["favorite_products"])
+
+    _, body = get(client, token, '/api/orders')
+    assert orders_of(body)
+    assert all(set(order) == fields('order') | {'items'} for order in orders_of(body))
+    assert all(set(item) == fields('order_item') for order in orders_of(body) for item in order["items"])
+
+
+def test_projections(client, token):
+    status, body = get(client, token, '/api/products?fields=id,name')
+    assert status == 200
+    assert body["products"] and all(set(product) == {'id', 'name'} for product in body["products"])
+
+    _, body = get(client, token, '/api/products?fields=id&include=category&fields[category]=title')
+    assert all(product == {'id': product["id"], 'category': {'title': product["category"]["title"]}}
+               for product in body["products"])
+
+    _, body = get(client, token, '/api/categories?fields=id,title,product_count')
+    assert all(set(category) == {'id', 'title', 'product_count'} for category in body["categories"])
+    assert sum(category["product_count"] for category in body["categories"]) == 20
+
+    _, body = get(client, token, '/api/categories?fields=id&include=products&fields[products]=id,price')
+    assert all(set(category) == {'id', 'products'} for category in body["categories"])
+    assert all(set(product) == {'id', 'price'} for category in body["categories"] for product in category["products"])
+
+    _, body = get(client, token, '/api/get_user_data?fields=id&include=favorites&fields[favorites]=id,price')
+    assert set(body["user"]) == {'id', 'favorite_products'}
+    assert body["user"]["favorite_products"]
+    assert all(set(product) == {'id', 'price'} for product in body["user"]["favorite_products"])
+
+    _, body = get(client, token, '/api/orders?fields=id,total')
+    assert all(set(order) == {'id', 'total'} for order in orders_of(body))
+
+    _, body = get(client, token, '/api/orders?fields=id&include=items&fields[items]=id,quantity')
+    assert all(set(order) == {'id', 'items'} for order in orders_of(body))
+    assert all(set(item) == {'id', 'quantity'} for order in orders_of(body) for item in order["items"])
+
+
+@pytest.mark.parametrize('url, message', [
+    ('/api/products?fields=quantity', 'Unknown field: quantity'),
+    ('/api/products?include=favorites', 'Unknown include: favorites'),
+    ('/api/products?include=category&fields[category]=products', 'Unknown field of category: products'),
+    ('/api/top_rated_products?fields=id,quantity', 'Unknown field: quantity'),
+    ('/api/categories?include=products&fields[products]=quantity', 'Unknown field of products: quantity'),
+    ('/api/categories?fields[products]=id', 'fields[products] requires include=products'),
+    ('/api/get_user_data?include=favorites&fields[favorites]=is_favorite', 'Unknown field of favorites: is_favorite'),
+    ('/api/get_user_data?include=orders', 'Unknown include: orders'),
+    ('/api/orders?include=items&fields[items]=best_seller', 'Unknown field of items: best_seller'),
+    ('/api/orders?fields=id,items', 'Unknown field: items'),
+])
+def test_unknown_fields_and_includes(client, token, url, message):
+    status, body = get(client, token, url)
+    assert status == 400
+    assert body["status"] is False
+    assert body["message"].startswith(message)
@@ -0,0 +1,69 @@
+import pytest
+from flask import has_request_context
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from models import db, User
+from cache import catalog_cache
+from identity import user_cache
+from revocation import token_claims
+from seed_data import seed
+from sql_trace import result_size
+
+# Query counts of the listing endpoints.
+# Seeds N products (and a user with about as many favorites), counts the queries
+# of each endpoint, then grows the catalog to 10N and counts again: a listing
+# that loads favorites or categories per product would take more queries the
+# second time.
+
+N = 50
+ENDPOINTS = ('/api/products', '/api/categories', '/api/get_user_data')
+
+
+def seed_step(products):
+    # One user whose favorites grow with the catalog, returns a token of that user
+    seeded = seed(1, 3, products, favorites_per_user=products, orders_per_user=0)
+    db.session.commit()
+    user = db.session.get(User, seeded["users"][0])
+    return create_access_token(identity=user.id, additional_claims=token_claims(user))
+
+
+def count_queries(client, queries, url, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get(url, headers=headers).status_code == 200  # Warm-up
+    catalog_cache.clear()
+    user_cache.clear()
+    queries[0] = 0
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return queries[0], response.get_json()
+
+
+@pytest.fixture(scope='module')
+def counts(app):
+    queries = [0]
+
+    def count_query(*_):
+        if has_request_context():
+            queries[0] += 1
+
+    client = app.test_client()
+    results = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+    try:
+        for products in (N, 9 * N):  # N products, then 10N in total
+            with app.app_context():
+                token = seed_step(products)
+            results.append({url: count_queries(client, queries, url, token) for url in ENDPOINTS})
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', count_query)
+    return results
+
+
+@pytest.mark.parametrize('url', ENDPOINTS)
+def test_query_count_does_not_grow_with_results(counts, url):
+    (small_count, small), (large_count, large) = counts[0][url], counts[1][url]
+    assert result_size(large) >= 5 * result_size(small)  # The second response really is bigger
+    assert large_count == small_count
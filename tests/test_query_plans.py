@@ -0,0 +1,11 @@
+from query_plans import check_query_plans
+
+# The main query of each endpoint must not read a table sequentially, see query_plans.py.
+# check_query_plans seeds its dataset inside a transaction and rolls it back.
+
+N_PRODUCTS = 2000
+
+
+def test_endpoint_queries_use_indexes(app):
+    with app.app_context():
+        assert check_query_plans(n_products=N_PRODUCTS) == {}
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask_jwt_extended import decode_token
+
+from models import db, User, UserRevocation
+from revocation import VERSION_CLAIM, Denylist, denylist, set_blocked
+from seed_data import seed, SEED_PASSWORD
+
+# Token revocation and blocked users, see revocation.py.
+
+
+@pytest.fixture(scope='module')
+def user_ids(app):
+    with app.app_context():
+        seeded = seed(4, 1, 5, orders_per_user=0)
+        db.session.commit()
+    return list(seeded["users"])
+
+
+def email(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).email
+
+
+def login(client, app, user_id, password=SEED_PASSWORD):
+    response = client.post('/api/login', data={'email': email(app, user_id), 'password': password})
+    return response.status_code, response.get_json()
+
+
+def auth(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_password_change_revokes_earlier_tokens(app, client, user_ids):
+    status, body = login(client, app, user_ids[0])
+    assert status == 200
+    old_access, old_refresh = body['access_token'], body['refresh_token']
+
+    response = client.post('/api/change_password', headers=auth(old_access), data={
+        'current_password': SEED_PASSWORD, 'new_password': 'password2', 'new_password_confirm': 'password2'})
+    assert response.status_code == 200
+    new_access = response.get_json()['access_token']
+    with app.app_context():
+        assert decode_token(new_access)[VERSION_CLAIM] == decode_token(old_access)[VERSION_CLAIM] + 1
+
+    assert client.get('/api/get_user_data', headers=auth(old_access)).status_code == 401
+    assert client.post('/api/refresh_token', headers=auth(old_refresh)).status_code == 401
+    assert client.get('/api/get_user_data', headers=auth(new_access)).status_code == 200
+
+
+def test_refresh_copies_the_version_claim(app, client, user_ids):
+    status, body = login(client, app, user_ids[1])
+    assert status == 200
+
+    response = client.post('/api/refresh_token', headers=auth(body['refresh_token']))
+    assert response.status_code == 200
+    access_token = response.get_json()['access_token']
+    with app.app_context():
+        assert decode_token(access_token)[VERSION_CLAIM] == decode_token(body['refresh_token'])[VERSION_CLAIM]
+    assert client.get('/api/get_user_data', headers=auth(access_token)).status_code == 200
+
+
+def test_block_and_unblock(app, client, user_ids):
+    runner = app.test_cli_runner()
+    status, body = login(client, app, user_ids[2])
+    assert status == 200
+    token = body['access_token']
+
+    assert runner.invoke(args=['block-user', email(app, user_ids[2])]).exit_code == 0
+    assert client.get('/api/get_user_data', headers=auth(token)).status_code == 403
+    assert login(client, app, user_ids[2])[0] == 403
+
+    assert runner.invoke(args=['unblock-user', email(app, user_ids[2])]).exit_code == 0
+    # Unblocking doesn't bring the old tokens back, the user logs in again
+    assert client.get('/api/get_user_data', headers=auth(token)).status_code == 401
+    status, body = login(client, app, user_ids[2])
+    assert status == 200
+    assert client.get('/api/get_user_data', headers=auth(body['access_token'])).status_code == 200
+
+
+def test_refresh_replays_changes_of_other_workers(app, user_ids):
+    # Another worker's denylist only learns about a change from the log
+    other_worker = Denylist()
+    user_id = user_ids[3]
+    with app.app_context():
+        other_worker.refresh_if_due(0)
+        assert other_worker.get(user_id) is None
+
+        user = db.session.get(User, user_id)
+        set_blocked(user)
+        db.session.commit()
+        assert denylist.get(user_id) == (user.token_version, True)  # This worker applies its own commit at once
+
+        other_worker.refresh_if_due(0)
+        assert other_worker.get(user_id) == (1, True)
+
+        def log(row_id, token_version, blocked, age=timedelta(0)):
+            db.session.execute(UserRevocation.__table__.insert(), [{
+                "id": row_id, "user_id": user_id, "token_version": token_version, "blocked": blocked,
+                "created_at": datetime.now(timezone.utc) - age,
+            }])
+            db.session.commit()
+
+        last_id = db.session.execute(db.select(db.func.max(UserRevocation.id))).scalar()
+        log(last_id + 10, 2, False)  # Unblocked through another worker
+        other_worker.refresh_if_due(0)
+        assert other_worker.get(user_id) == (2, False)
+
+        # A row committed late, with a lower id than one already read, is still picked up
+        log(last_id + 5, 3, True)
+        other_worker.refresh_if_due(0)
+        assert other_worker.get(user_id) == (3, True)
+
+        # Rows older than the late commit window are not read again
+        log(last_id + 4, 4, False, age=timedelta(hours=1))
+        other_worker.refresh_if_due(0)
+        assert other_worker.get(user_id) == (3, True)
+
+
+def test_deleting_a_user_revokes_its_tokens_on_every_worker(app, client):
+    with app.app_context():
+        user_id = seed(1, 1, 1, favorites_per_user=0, orders_per_user=0)["users"][0]
+        db.session.commit()
+    status, body = login(client, app, user_id)
+    assert status == 200
+    token = body['access_token']
+
+    assert client.delete('/api/delete_user', headers=auth(token)).status_code == 200
+    other_worker = Denylist()
+    with app.app_context():
+        other_worker.refresh_if_due(0)
+    assert other_worker.get(user_id) == (1, False)
+    assert client.get('/api/get_user_data', headers=auth(token)).status_code == 401